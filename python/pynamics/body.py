@@ -5,8 +5,11 @@ Email: danaukes<at>gmail.com
 Please see LICENSE for full license.
 """
 import pynamics
+from functools import cached_property
+from pynamics.point import Point
 
 class BodyGeneric(object):
+    '''effective forces, KE and momenta are computed on first use'''
     def __init__(self,name,frame,pCM,vCM,aCM,wNBody,alNBody,mass,inertia,system):
         self.name = name
         self.frame = frame
@@ -23,27 +26,46 @@ class BodyGeneric(object):
         self.wNBody = wNBody
         self.alNBody=alNBody
         
-        self.effectiveforce = self.mass*self.aCM
-        self.momentofeffectiveforce= self.inertia.dot(self.alNBody)+self.wNBody.cross(self.inertia.dot(self.wNBody))
-        self.KE = .5*mass*self.vCM.dot(self.vCM) + .5*self.wNBody.dot(self.inertia.dot(self.wNBody))
-        self.linearmomentum = self.mass*self.vCM
-        self.angularmomentum = self.inertia.dot(self.wNBody)
-        
+        self.dynamics_added = False
         self.system.bodies.append(self)
-        self.adddynamics()
         pynamics.addself(self,name)
 
+    @cached_property
+    def angularmomentum(self):
+        return self.inertia.dot(self.wNBody)
+
+    @cached_property
+    def linearmomentum(self):
+        return self.mass*self.vCM
+
+    @cached_property
+    def effectiveforce(self):
+        return self.mass*self.aCM
+
+    @cached_property
+    def momentofeffectiveforce(self):
+        return self.inertia.dot(self.alNBody)+self.wNBody.cross(self.angularmomentum)
+
+    @cached_property
+    def KE(self):
+        return .5*self.mass*self.vCM.dot(self.vCM) + .5*self.wNBody.dot(self.angularmomentum)
+
     def adddynamics(self):
+        if self.dynamics_added:
+            return
+        self.dynamics_added = True
         self.system.addeffectiveforce(self.effectiveforce,self.vCM)
         self.system.addeffectiveforce(self.momentofeffectiveforce,self.wNBody)
 #        self.system.addmomentum(self.linearmomentum,self.vCM)
 #        self.system.addmomentum(self.angularmomentum,self.wNBody)
-        self.system.addKE(self.KE)
+        if self.forcegravity is not None:
+            self.system.addforce(self.forcegravity,self.vCM)
 
     def addforcegravity(self,gravityvector):
         self.gravityvector = gravityvector
         self.forcegravity = self.mass*self.gravityvector
-        self.system.addforce(self.forcegravity,self.vCM)
+        if self.dynamics_added:
+            self.system.addforce(self.forcegravity,self.vCM)
         
     def __repr__(self):
         return self.name+'(body)'
@@ -53,49 +75,43 @@ class BodyGeneric(object):
 #        return self.name+' <frame {0:#x}>'.format(self.__hash__())
 
 
-class Body(object):
+class Body(BodyGeneric):
+    '''kinematics come from pCM, which may be a Point, and frame on first use'''
     def __init__(self,name,frame,pCM,mass,inertia,system):
         self.name = name
         self.frame = frame
         self.system = system
+        self.point = None
+        if isinstance(pCM,Point):
+            self.point = pCM
+            pCM = pCM.position
         self.pCM = pCM
         self.mass = mass
         self.inertia= inertia
-        self.vCM=self.pCM.diff_in_parts(self.system.newtonian,self.system)
-        self.aCM=self.vCM.diff_in_parts(self.system.newtonian,self.system)
         
         self.gravityvector = None
         self.forcegravity = None        
         
-        self.wNBody = self.system.newtonian.getw_(self.frame)
-        self.alNBody=self.wNBody.diff_in_parts(self.system.newtonian,self.system)
-        
-        self.effectiveforce = self.mass*self.aCM
-        self.momentofeffectiveforce= self.inertia.dot(self.alNBody)+self.wNBody.cross(self.inertia.dot(self.wNBody))
-        self.KE = .5*mass*self.vCM.dot(self.vCM) + .5*self.wNBody.dot(self.inertia.dot(self.wNBody))
-#        self.linearmomentum = self.mass*self.vCM
-#        self.angularmomentum = self.inertia.dot(self.wNBody)
-        
+        self.dynamics_added = False
         self.system.bodies.append(self)
-        self.adddynamics()
         pynamics.addself(self,name)
 
-    def adddynamics(self):
-        self.system.addeffectiveforce(self.effectiveforce,self.vCM)
-        self.system.addeffectiveforce(self.momentofeffectiveforce,self.wNBody)
-#        self.system.addmomentum(self.linearmomentum,self.vCM)
-#        self.system.addmomentum(self.angularmomentum,self.wNBody)
-        self.system.addKE(self.KE)
+    @cached_property
+    def vCM(self):
+        if self.point is not None:
+            return self.point.velocity
+        return self.pCM.diff_in_parts(self.system.newtonian,self.system)
 
-    def addforcegravity(self,gravityvector):
-        self.gravityvector = gravityvector
-        self.forcegravity = self.mass*self.gravityvector
-        self.system.addforce(self.forcegravity,self.vCM)
-        
-    def __repr__(self):
-        return self.name+'(body)'
-#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
-    def __str__(self):
-        return self.name+'(body)'
-#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
+    @cached_property
+    def aCM(self):
+        if self.point is not None:
+            return self.point.acceleration
+        return self.vCM.diff_in_parts(self.system.newtonian,self.system)
+
+    @cached_property
+    def wNBody(self):
+        return self.system.newtonian.getw_(self.frame)
 
+    @cached_property
+    def alNBody(self):
+        return self.wNBody.diff_in_parts(self.system.newtonian,self.system)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import os
+import pickle
+import hashlib
+import tempfile
+import collections
+import sympy
+
+def describe(item):
+    '''stable text description of a model object, used for hashing'''
+    from pynamics.vector import Vector
+    from pynamics.frame import Frame
+    from pynamics.dyadic import Dyadic
+    if isinstance(item,Vector):
+        components = sorted((frame.name,sympy.srepr(vec)) for frame,vec in item.components.items())
+        return 'Vector'+repr(components)
+    elif isinstance(item,Frame):
+        return 'Frame('+item.name+')'
+    elif isinstance(item,Dyadic):
+        components = sorted((frame1.name,frame2.name,sympy.srepr(matrix)) for (frame1,frame2),matrix in item.components.items())
+        return 'Dyadic'+repr(components)
+    elif isinstance(item,(list,tuple)):
+        return '['+','.join(describe(element) for element in item)+']'
+    elif isinstance(item,dict):
+        return '{'+','.join(sorted(describe(key)+':'+describe(value) for key,value in item.items()))+'}'
+    elif isinstance(item,(sympy.Basic,sympy.MatrixBase)):
+        return sympy.srepr(item)
+    else:
+        return repr(item)
+
+def describe_system(system):
+    '''
+    Description of everything the equations of motion are derived from:
+    generalized coordinates, constants, frames and their rotations, bodies,
+    particles, applied forces and springs.  Constant values are left out, as
+    the derivation does not depend on them.  Bodies are described by their
+    inputs rather than their effective forces, so nothing is derived here,
+    and the terms System.materialize adds for them are left out of the force
+    lists.
+    '''
+    derived = set()
+    for body in system.bodies+system.particles:
+        if body.dynamics_added:
+            derived.add(id(body.forcegravity))
+            derived.add(id(body.effectiveforce))
+            if body in system.bodies:
+                derived.add(id(body.momentofeffectiveforce))
+    lines = []
+    lines.append(describe([system.get_q(ii) for ii in range(3)]))
+    lines.append(describe(sorted(str(key) for key in system.constants)))
+
+    frames = []
+    try:
+        unvisited = [system.newtonian]
+    except AttributeError:
+        unvisited = []
+    while unvisited:
+        frame = unvisited.pop()
+        if frame not in frames:
+            frames.append(frame)
+            unvisited.extend(frame.connections.keys())
+    for frame in sorted(frames,key=lambda item:item.name):
+        for other,rotation in sorted(frame.connections.items(),key=lambda item:item[0].name):
+            lines.append(describe((frame,other,rotation.to_other(frame),rotation.w__from(frame))))
+
+    for body in system.bodies:
+        lines.append(describe((body.name,body.frame,body.pCM,body.mass,body.inertia,body.gravityvector)))
+    for particle in system.particles:
+        lines.append(describe((particle.name,particle.pCM,particle.mass,particle.gravityvector)))
+    lines.append(describe([item for item in system.forces if id(item[0]) not in derived]))
+    lines.append(describe([item for item in system.effectiveforces if id(item[0]) not in derived]))
+    lines.append(describe(system.springs))
+    return '\n'.join(lines)
+
+class LRUCache(object):
+    '''
+    In-memory cache holding at most maxsize entries, evicting the least
+    recently used.  maxsize=0 disables it.  Counts hits, misses and
+    evictions.
+    '''
+    def __init__(self,maxsize = 4096):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self,key,default = None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses+=1
+            return default
+        self.entries.move_to_end(key)
+        self.hits+=1
+        return value
+
+    def put(self,key,value):
+        if self.maxsize<=0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries)>self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions+=1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'hits':self.hits,'misses':self.misses,'evictions':self.evictions,'size':len(self.entries),'maxsize':self.maxsize}
+
+class DerivationCache(object):
+    '''
+    Persistent, content-addressed store of derived equations of motion.
+
+    Entries are pickled into directory under the sha1 of a description of
+    their inputs, so a repeated run with an unchanged model loads the result
+    instead of deriving it again.  Attach it with System.set_cache.
+    '''
+    def __init__(self,directory = '.pynamics_cache'):
+        self.directory = directory
+
+    def key(self,*items):
+        return hashlib.sha1(describe(items).encode('utf-8')).hexdigest()
+
+    def model_key(self,system,*items):
+        text = describe_system(system)+'\n'+describe(items)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def path(self,key):
+        return os.path.join(self.directory,key+'.pickle')
+
+    def load(self,key):
+        try:
+            with open(self.path(key),'rb') as f:
+                return pickle.load(f)
+        except (IOError,OSError,EOFError,pickle.UnpicklingError):
+            return None
+        except (AttributeError,ImportError):
+            # pickled by a version whose classes have since moved or changed
+            return None
+
+    def save(self,key,value):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd,tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd,'wb') as f:
+            pickle.dump(value,f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp,self.path(key))
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory,filename))
@@ -5,106 +5,145 @@ Email: danaukes<at>gmail.com
 Please see LICENSE for full license.
 """
 
-class Dyad(object):
-    def __init__(self,vector1,vector2):
-        self.vector1 = vector1
-        self.vector2 = vector2
-    def __str__(self):
-        return str((self.vector1.symbolic(),self.vector2.symbolic()))
-    def __repr__(self):
-        return str(self)
-    def __rmul__(self,other):
-        new = type(self)(other*self.vector1,self.vector2.copy())
-        return new
-    def __mul__(self,other):
-        new = type(self)(self.vector1.copy(),self.vector2*other)
-        return new
-    def __neg__(self):
-        return -1*self
-    def dyads(self):
-        return [self]
-
-    def dot(self,vector):
-        return self.vector1*self.vector2.dot(vector)
-
-    def rdot(self,vector):
-        return vector.dot(self.vector1)*self.vector2
+import sympy
+from pynamics.vector import Vector,immutable,clean_components
 
-    def cross(self,vector):
-        return type(self)(self.vector1.copy(),self.vector2.cross(vector))
-
-    def rcross(self,vector):
-        return type(self)(vector.cross(self.vector1),self.vector2.copy())
+def skew(c):
+    '''matrix of the cross product c x _'''
+    return sympy.ImmutableMatrix([[0,-c[2],c[1]],[c[2],0,-c[0]],[-c[1],c[0],0]])
 
-    def __add__(self,other):
-        new = Dyadic(self.dyads()+other.dyads())
-        return new
+class Dyadic(object):
+    '''
+    Sum of dyads stored as one 3x3 matrix per (frame1,frame2) pair: the
+    entry i,j of components[(frame1,frame2)] multiplies the dyad formed by
+    basis vector i of frame1 and basis vector j of frame2.  Products with a
+    vector express the vector once per pair and take one matrix product.
+    '''
+    __slots__ = ['components']
+
+    def __init__(self,components = None):
+        new = {}
+        if components!=None:
+            for key,matrix in components.items():
+                matrix = immutable(matrix)
+                if key in new:
+                    matrix = new[key]+matrix
+                new[key] = matrix
+        self.components = clean_components(new)
 
-    def __radd__(self,other):
-        new = Dyadic(other.dyads()+self.dyads())
-        return new
-        
-    def __sub__(self,other):
-        new = Dyadic(self.dyads() + [-dyad for dyad in other.dyads()])
+    @classmethod
+    def from_components(cls,components):
+        new = object.__new__(Dyadic)
+        new.components = components
         return new
 
-    def __rsub__(self,other):
-        new = Dyadic(other.dyads() + [-dyad for dyad in self.dyads()])
-        return new
-        
-class Dyadic(object):
-    def __init__(self,dyads):
-        self._dyads = dyads
     def dyads(self):
-        return self._dyads
+        return [Dyadic.from_components({key:matrix}) for key,matrix in self.components.items()]
+
     def __str__(self):
-        return ''.join([str(dyad)+'+' for dyad in self._dyads[:-1]]+[str(self._dyads[-1])])
+        terms = []
+        for (frame1,frame2),matrix in self.components.items():
+            for ii,sym1 in enumerate(frame1.syms):
+                for jj,sym2 in enumerate(frame2.syms):
+                    if matrix[ii,jj]!=0:
+                        terms.append(str(matrix[ii,jj])+'*('+str(sym1)+','+str(sym2)+')')
+        return '+'.join(terms) or '0'
     def __repr__(self):
         return str(self)
 
+    def combine(self,other,sign = 1):
+        new = self.components.copy()
+        for key,matrix in other.components.items():
+            if sign!=1:
+                matrix = -matrix
+            if key in new:
+                matrix = new[key]+matrix
+            new[key] = matrix
+        return Dyadic.from_components(clean_components(new))
+
     def __add__(self,other):
-        new = Dyadic(self.dyads()+other.dyads())
-        return new
+        if isinstance(other,Dyadic):
+            return self.combine(other)
+        if other==0:
+            return self
+        return NotImplemented
     def __radd__(self,other):
-        new = Dyadic(other.dyads()+self.dyads())
-        return new
+        return self.__add__(other)
+
+    def __sub__(self,other):
+        return self.combine(other,-1)
+    def __rsub__(self,other):
+        return (-self).__add__(other)
+
+    def __rmul__(self,other):
+        return Dyadic.from_components(clean_components(dict((key,other*matrix) for key,matrix in self.components.items())))
+    def __mul__(self,other):
+        return Dyadic.from_components(clean_components(dict((key,matrix*other) for key,matrix in self.components.items())))
+    def __neg__(self):
+        return Dyadic.from_components(dict((key,-matrix) for key,matrix in self.components.items()))
+
+    @staticmethod
+    def coordinates(vector,frame):
+        '''components of vector in frame, or None if it is zero'''
+        return vector.express(frame).components.get(frame)
 
     def dot(self,vector):
-        return sum([dyad.dot(vector) for dyad in self._dyads])
+        '''self.vector'''
+        result = Vector()
+        for (frame1,frame2),matrix in self.components.items():
+            c = self.coordinates(vector,frame2)
+            if c is not None:
+                result+=Vector({frame1:matrix*c})
+        return result
 
     def rdot(self,vector):
-        return sum([vector.dot(dyad) for dyad in self._dyads])
+        '''vector.self'''
+        result = Vector()
+        for (frame1,frame2),matrix in self.components.items():
+            c = self.coordinates(vector,frame1)
+            if c is not None:
+                result+=Vector({frame2:matrix.T*c})
+        return result
 
     def cross(self,vector):
-        return Dyadic([dyad.cross(vector) for dyad in self._dyads])
+        '''self x vector'''
+        new = {}
+        for (frame1,frame2),matrix in self.components.items():
+            c = self.coordinates(vector,frame2)
+            if c is not None:
+                new[(frame1,frame2)] = matrix*skew(c)
+        return Dyadic(new)
 
     def rcross(self,vector):
-        return Dyadic([vector.cross(dyad) for dyad in self._dyads])
-
-    def __rmul__(self,other):
-        return Dyadic([other*dyad for dyad in self._dyads])
-
-    def __mul__(self,other):
-        return Dyadic([dyad*other for dyad in self._dyads])
-
-    def __neg__(self):
-        return -1*self
-        
-    def __sub__(self,other):
-        new = Dyadic(self.dyads() + [-dyad for dyad in other.dyads()])
-        return new
-
-    def __rsub__(self,other):
-        new = Dyadic(other.dyads() + [-dyad for dyad in self.dyads()])
-        return new
+        '''vector x self'''
+        new = {}
+        for (frame1,frame2),matrix in self.components.items():
+            c = self.coordinates(vector,frame1)
+            if c is not None:
+                new[(frame1,frame2)] = skew(c)*matrix
+        return Dyadic(new)
 
     @classmethod
     def build(cls,frame,Ixx = 0,Iyy = 0, Izz = 0):
-        result = Ixx*Dyad(frame.x,frame.x)+Iyy*Dyad(frame.y,frame.y)+Izz*Dyad(frame.z,frame.z)
-        return result
+        return Dyadic({(frame,frame):sympy.diag(Ixx,Iyy,Izz)})
+
+class Dyad(Dyadic):
+    '''the dyad vector1 vector2, built as a Dyadic'''
+    __slots__ = []
+
+    def __init__(self,vector1,vector2):
+        new = {}
+        for frame1,vec1 in vector1.components.items():
+            for frame2,vec2 in vector2.components.items():
+                matrix = vec1*vec2.T
+                key = (frame1,frame2)
+                if key in new:
+                    matrix = new[key]+matrix
+                new[key] = matrix
+        self.components = clean_components(new)
 
 if __name__=='__main__':
     from pynamics.frame import Frame
     A = Frame('A')
     dyad = Dyad(A.x,A.x)
-    d = dyad+dyad
\ No newline at end of file
+    d = dyad+dyad
@@ -8,7 +8,7 @@ Please see LICENSE for full license.
 
 import pynamics
 from pynamics.tree_node import TreeNode
-from pynamics.vector import Vector
+from pynamics.vector import Vector,cost,product_cache
 from pynamics.name import Name
 from pynamics.rotation import Rotation,FixedAxisRotation
 
@@ -17,35 +17,57 @@ import sympy
 
 #class Frame(TreeNode,PynamicsObject):
 class Frame(TreeNode):
+    _version = 0
     def __init__(self,name = None):
         super(Frame,self).__init__()
         self.connections = {}
         self.precomputed = {}
+        self.precomputed_version = Frame._version
         self.reps = {}
         if name==None:
             name=Name.frame()
         self.name = name
         
-        self.x = Vector()
-        self.y = Vector()
-        self.z = Vector()
+        self.x = Vector({self:[1,0,0]})
+        self.y = Vector({self:[0,1,0]})
+        self.z = Vector({self:[0,0,1]})
 
         self.x_sym = sympy.Symbol(name+'.x')
         self.y_sym = sympy.Symbol(name+'.y')
         self.z_sym = sympy.Symbol(name+'.z')
         self.syms = sympy.Matrix([self.x_sym,self.y_sym,self.z_sym])
-        
-        self.x.add_component(self,[1,0,0])
-        self.y.add_component(self,[0,1,0])
-        self.z.add_component(self,[0,0,1])
+
         self.add_rotation(Rotation(self,self,sympy.Matrix.eye(3),sympy.Number(0)*self.x))
         pynamics.addself(self,name)
         
     def add_rotation(self,rotation):
         self.connections[rotation.other(self)] = rotation
+        Frame.invalidate_precomputed()
     def add_precomputed(self,rotation):
+        self.check_precomputed()
         self.precomputed[rotation.other(self)] = rotation
+    def add_branch(self,child):
+        super(Frame,self).add_branch(child)
+        Frame.invalidate_precomputed()
+
+    @staticmethod
+    def invalidate_precomputed():
+        '''composed rotations cached by calc are discarded lazily, the next time each frame is used'''
+        Frame._version+=1
+        product_cache.clear()
+    def check_precomputed(self):
+        if self.precomputed_version!=Frame._version:
+            self.precomputed.clear()
+            self.reps.clear()
+            self.precomputed_version = Frame._version
     
+    def __getstate__(self):
+        '''composed rotations and product tables are rebuilt on demand rather than pickled'''
+        state = self.__dict__.copy()
+        state['precomputed'] = {}
+        state['reps'] = {}
+        return state
+
     def __str__(self):
         return self.name
     def __repr__(self):
@@ -54,22 +76,24 @@ class Frame(TreeNode):
     def calc(self,other):
         if other in self.connections:
             return self.connections[other]
-        elif other in self.precomputed:
+        self.check_precomputed()
+        if other in self.precomputed:
             return self.precomputed[other]
         else: 
             path = self.path_to(other)
-            from_frames = path[:-1]
-            to_frames = path[1:]
-            Rs = [from_frame.connections[to_frame].to_other(from_frame) for from_frame,to_frame in zip(from_frames,to_frames)]
-            w_s = [from_frame.connections[to_frame].w__from(from_frame) for from_frame,to_frame in zip(from_frames,to_frames)]
-            R_final = Rs.pop(0)      
-            w_final = w_s.pop(0)      
-            for R,w_,to_frame in zip(Rs,w_s,to_frames):
-                R_final = R*R_final
-                w_final += w_
+            for ii in range(len(path)-2,0,-1):
+                if path[ii] in self.precomputed or path[ii] in self.connections:
+                    break
+            rotation = self.calc(path[ii])
+            R_final = rotation.to_other(self)
+            w_final = rotation.w__from(self)
+            for from_frame,to_frame in zip(path[ii:-1],path[ii+1:]):
+                connection = from_frame.connections[to_frame]
+                R_final = connection.to_other(from_frame)*R_final
+                w_final += connection.w__from(from_frame)
                 rotation = Rotation(self,to_frame,R_final,w_final)
-#                self.add_precomputed(rotation)
-#                to_frame.add_precomputed(rotation)
+                self.add_precomputed(rotation)
+                to_frame.add_precomputed(rotation)
             return rotation
 
     def getR(self,other):
@@ -85,6 +109,12 @@ class Frame(TreeNode):
         fromframe.add_branch(self)        
         
     def efficient_rep(self,other,functionname):
+        '''
+        the frame along the path to other in which each pair of basis vectors
+        has the cheapest product, by expression node count.  The table is
+        shared by both frames and dropped when the frame tree changes.
+        '''
+        self.check_precomputed()
         key = (other,functionname)
         if key in self.reps:
             return self.reps[key]
@@ -93,14 +123,14 @@ class Frame(TreeNode):
             dot = {}
             for mysym,myvec in zip(self.syms,[self.x,self.y,self.z]):
                 for othersym,othervec in zip(other.syms,[other.x,other.y,other.z]):
-                    min_dot_len = 0
+                    min_dot_len = None
                     for frame in path:
                         v1 = myvec.express(frame).components[frame]
                         v2 = othervec.express(frame).components[frame]
                         function = getattr(v1,functionname)
                         dot_rep = function(v2)
-                        dot_len = len(str(dot_rep))
-                        if min_dot_len==0 or dot_len<min_dot_len:
+                        dot_len = cost(dot_rep)
+                        if min_dot_len is None or dot_len<min_dot_len:
                             min_dot_len=dot_len
                             min_dot_frame = frame
                         elif dot_len==min_dot_len:
@@ -108,5 +138,7 @@ class Frame(TreeNode):
                                 min_dot_frame = frame
                     dot[frozenset((mysym,othersym))] = min_dot_frame
             self.reps[key] = dot
+            other.check_precomputed()
+            other.reps[(self,functionname)] = dot
             return dot
                 
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import time as clock
+
+class Instrumentation(object):
+    '''
+    Collects statistics from the state-space functions built by System and
+    from the integrators that call them.
+
+    calls: number of state-space function calls
+    time_evaluate: wall time spent evaluating A and b (or the accelerations)
+    time_solve: wall time spent in the linear solve and assembling the result
+    integrator_stats: statistics reported by the integrator
+
+    progress(time) is called with the simulated time every time it has
+    advanced by at least cadence since the last callback (every call if
+    cadence is None).  Pass progress=print for the old console output.
+    '''
+    def __init__(self,progress = None,cadence = None):
+        self.progress = progress
+        self.cadence = cadence
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.time_evaluate = 0.
+        self.time_solve = 0.
+        self.next_progress = None
+        self.integrator_stats = {}
+
+    def record_call(self,time,time_evaluate,time_solve):
+        self.calls+=1
+        self.time_evaluate+=time_evaluate
+        self.time_solve+=time_solve
+        if self.progress is not None:
+            if self.next_progress is None or time>=self.next_progress:
+                self.progress(time)
+                self.next_progress = time+(self.cadence or 0)
+
+    def record_integrator(self,stats):
+        '''
+        accepts an odeint infodict, a solve_ivp result or a plain dict, and
+        replaces the statistics of any earlier run
+        '''
+        self.integrator_stats = {}
+        for key in ['nfev','njev','nlu','status','message','nfe','nje','nst','nqu','hu','tcur','mused']:
+            try:
+                self.integrator_stats[key] = stats[key]
+            except (KeyError,TypeError):
+                if hasattr(stats,key):
+                    self.integrator_stats[key] = getattr(stats,key)
+
+    def summary(self):
+        summary = {}
+        summary['calls'] = self.calls
+        summary['time_evaluate'] = self.time_evaluate
+        summary['time_solve'] = self.time_solve
+        summary.update(self.integrator_stats)
+        return summary
+
+def compose(evaluate,finish,instrumentation = None):
+    '''
+    Build a state-space function func(state,time,*args) from its two stages:
+    evaluate(state,*args) returns a tuple of evaluated terms, and
+    finish(state,*terms) solves for and returns the derivative.  Without
+    instrumentation no timing or bookkeeping is added.
+    '''
+    if instrumentation is None:
+        def func(state,time,*args):
+            return finish(state,*evaluate(state,*args))
+    else:
+        perf_counter = clock.perf_counter
+        def func(state,time,*args):
+            t0 = perf_counter()
+            terms = evaluate(state,*args)
+            t1 = perf_counter()
+            result = finish(state,*terms)
+            instrumentation.record_call(time,t1-t0,perf_counter()-t1)
+            return result
+    return func
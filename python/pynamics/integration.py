@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import numpy
+
+def rk4(func,ini,t,args=()):
+    '''
+    Fixed-step fourth order Runge-Kutta over the time points in t.  ini may
+    be a single state or an (N,n_state) ensemble, advanced in lock-step.
+    Returns an array of shape (len(t),)+ini.shape.
+    '''
+    x = numpy.array(ini,dtype=float)
+    states = numpy.empty((len(t),)+x.shape)
+    states[0] = x
+    for ii in range(len(t)-1):
+        t0 = t[ii]
+        h = t[ii+1]-t0
+        k1 = numpy.array(func(x,t0,*args))
+        k2 = numpy.array(func(x+h/2*k1,t0+h/2,*args))
+        k3 = numpy.array(func(x+h/2*k2,t0+h/2,*args))
+        k4 = numpy.array(func(x+h*k3,t0+h,*args))
+        x = x+h/6*(k1+2*k2+2*k3+k4)
+        states[ii+1] = x
+    return states
+
+implicit_methods = ['Radau','BDF','LSODA']
+
+class Simulation(object):
+    '''
+    Result of simulate.
+
+    t, states: output times and the states at them
+    t_events, y_events: per event, the times and states where it occurred
+    stats: integrator statistics (nfev, njev, nlu, status, message, chunks)
+    '''
+    def __init__(self,t,states,t_events,y_events,solutions,stats):
+        self.t = t
+        self.states = states
+        self.t_events = t_events
+        self.y_events = y_events
+        self.solutions = solutions
+        self.stats = stats
+
+    def dense(self,t):
+        '''interpolate the states at times t, available with dense_output'''
+        if not self.solutions:
+            raise(Exception('simulate was run without dense_output'))
+        t = numpy.asarray(t,dtype=float)
+        states = numpy.empty((len(t),self.states.shape[-1]))
+        done = numpy.zeros(len(t),dtype=bool)
+        for solution in self.solutions:
+            select = (~done)&(t<=solution.t_max)
+            if solution is self.solutions[-1]:
+                select = ~done
+            if select.any():
+                states[select] = solution(t[select]).T
+            done|=select
+        return states
+
+def wrap_event(event,args):
+    def wrapped(time,state):
+        return event(state,time,*args)
+    wrapped.terminal = getattr(event,'terminal',False)
+    wrapped.direction = getattr(event,'direction',0)
+    return wrapped
+
+def simulate(func,ini,t,method = 'LSODA',rtol = 1e-6,atol = 1e-8,args = (),jac = None,events = None,dense_output = False,chunks = 1,steps_only = False,instrumentation = None,**kwargs):
+    '''
+    Integrate func(state,time,*args), as built by System.state_space_*, from
+    ini over t[0]..t[-1] and return a Simulation.
+
+    method: any scipy.integrate.solve_ivp method ('RK45', 'DOP853', 'Radau',
+    'BDF', 'LSODA', ...) or 'odeint'.  jac(state,time,*args) is used by the
+    implicit methods.
+    events: functions event(state,time,*args); set event.terminal to stop
+    at the first zero and event.direction to select crossings.
+    dense_output: keep the interpolants, see Simulation.dense.
+    chunks: integrate in this many consecutive pieces of the output grid,
+    each restarted from the end of the last, stopping after a terminal event.
+    steps_only: report states only at the integrator's own steps instead of
+    at the points in t.
+    instrumentation: records the integrator statistics.
+    Remaining keyword arguments go to the integrator.
+    '''
+    import scipy.integrate
+    if 't_eval' in kwargs:
+        raise(Exception('pass the output grid as t'))
+    t = numpy.asarray(t,dtype=float)
+    ini = numpy.array(ini,dtype=float)
+
+    if method=='odeint':
+        if events or dense_output or chunks!=1 or steps_only:
+            raise(Exception('odeint does not support events, dense output, chunks or steps_only'))
+        states,info = scipy.integrate.odeint(func,ini,t,args=tuple(args),Dfun=jac,rtol=rtol,atol=atol,full_output=True,**kwargs)
+        stats = {'nfev':int(info['nfe'][-1]),'njev':int(info['nje'][-1]),'nst':int(info['nst'][-1]),'message':info['message'],'chunks':1}
+        if instrumentation is not None:
+            instrumentation.record_integrator(stats)
+        return Simulation(t,states,[],[],[],stats)
+
+    # the functions may return a buffer they reuse, which solve_ivp would keep
+    def fun(time,state):
+        return numpy.array(func(state,time,*args))
+    if jac is not None and method in implicit_methods:
+        def jacobian(time,state):
+            return numpy.array(jac(state,time,*args))
+        kwargs['jac'] = jacobian
+    events = [wrap_event(event,args) for event in (events or [])]
+
+    boundaries = numpy.unique(numpy.r_[t[numpy.linspace(0,len(t)-1,chunks+1).astype(int)]])
+    times = []
+    states = []
+    t_events = [[] for event in events]
+    y_events = [[] for event in events]
+    solutions = []
+    stats = {'nfev':0,'njev':0,'nlu':0,'chunks':0}
+    x = ini
+    for t0,t1 in zip(boundaries[:-1],boundaries[1:]):
+        if not steps_only:
+            points = t[(t>=t0)&(t<=t1)]
+            if times:
+                points = points[points>t0]
+        else:
+            points = None
+        result = scipy.integrate.solve_ivp(fun,(t0,t1),x,method=method,t_eval=points,rtol=rtol,atol=atol,events=events or None,dense_output=dense_output,**kwargs)
+        stats['nfev']+=result.nfev
+        stats['njev']+=result.njev
+        stats['nlu']+=result.nlu
+        stats['status'] = result.status
+        stats['message'] = result.message
+        stats['chunks']+=1
+        if not steps_only or not times:
+            times.append(result.t)
+            states.append(result.y.T)
+        else:
+            times.append(result.t[1:])
+            states.append(result.y.T[1:])
+        for ii in range(len(events)):
+            t_events[ii].extend(result.t_events[ii])
+            y_events[ii].extend(result.y_events[ii])
+        if dense_output and result.sol is not None:
+            solutions.append(result.sol)
+        # stop on failure (-1) or a terminal event (1)
+        if result.status!=0:
+            break
+        # chunk boundaries are output points, so the last state is at t1
+        x = result.y[:,-1]
+
+    if instrumentation is not None:
+        instrumentation.record_integrator(stats)
+    times = numpy.concatenate(times) if times else numpy.empty((0,))
+    states = numpy.concatenate(states) if states else numpy.empty((0,len(ini)))
+    t_events = [numpy.array(item) for item in t_events]
+    y_events = [numpy.array(item) for item in y_events]
+    return Simulation(times,states,t_events,y_events,solutions,stats)
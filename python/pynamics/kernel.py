@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import math
+import importlib
+import numpy
+import sympy
+from sympy.printing.pycode import PythonCodePrinter
+from sympy.printing.numpy import NumPyPrinter
+
+class Kernel(object):
+    '''
+    Compiles a list of sympy matrices into a single python function which
+    evaluates every matrix in one call and writes the results into
+    preallocated numpy arrays.
+
+    args is a list of groups of symbols.  The generated function takes one
+    sequence per group, followed by one output array per matrix:
+
+        kernel(group0,group1,...,out0,out1,...)
+
+    Only structurally nonzero entries are written, so the output arrays must
+    come from allocate() (or be zeroed by the caller) and should not be shared
+    between kernels.
+
+    With cse=True, common subexpressions are eliminated across all of the
+    matrices at once, so intermediates shared between them are computed once
+    per call.
+
+    With module='numpy' the kernel broadcasts: each group member may be an
+    array of length N, and the outputs come from allocate(N) with shape
+    (N,rows,cols).
+    '''
+    def __init__(self,args,matrices,cse=False,module='math'):
+        self.args = [list(group) for group in args]
+        self.matrices = [sympy.Matrix(item) for item in matrices]
+        self.cse = cse
+        self.module = module
+        self.shapes = [item.shape for item in self.matrices]
+        self.source = self.generate()
+        namespace = {'math':math,'numpy':numpy}
+        for module in self.imports:
+            # the printer qualifies names fully, e.g. functools.reduce for Max
+            importlib.import_module(module)
+            top = module.split('.')[0]
+            namespace[top] = importlib.import_module(top)
+        exec(compile(self.source,'<pynamics kernel>','exec'),namespace)
+        self.function = namespace['kernel']
+
+    def __call__(self,*args):
+        return self.function(*args)
+
+    def allocate(self,*leading):
+        return [numpy.zeros(leading+shape) for shape in self.shapes]
+
+    def generate(self):
+        if self.module=='numpy':
+            printer = NumPyPrinter({'fully_qualified_modules':True})
+            index = '{0}[..., {1:d}, {2:d}] = {3}'
+        else:
+            printer = PythonCodePrinter({'fully_qualified_modules':True})
+            index = '{0}[{1:d}, {2:d}] = {3}'
+
+        replacements = {}
+        group_names = []
+        lines = []
+        for ii,group in enumerate(self.args):
+            group_name = '_s{0:d}'.format(ii)
+            group_names.append(group_name)
+            local_names = []
+            for symbol in group:
+                local = sympy.Symbol('_x{0:d}'.format(len(replacements)))
+                replacements[symbol] = local
+                local_names.append(str(local))
+            if len(local_names)==1:
+                lines.append('    {0}, = {1}'.format(local_names[0],group_name))
+            elif local_names:
+                lines.append('    {0} = {1}'.format(', '.join(local_names),group_name))
+
+        matrices = [matrix.xreplace(replacements) for matrix in self.matrices]
+        if self.cse:
+            intermediates,matrices = sympy.cse(matrices,symbols=sympy.numbered_symbols('_c'),order='none')
+            for symbol,item in intermediates:
+                lines.append('    {0} = {1}'.format(symbol,printer.doprint(item)))
+
+        out_names = ['_out{0:d}'.format(ii) for ii in range(len(matrices))]
+        for out_name,matrix in zip(out_names,matrices):
+            rows,cols = matrix.shape
+            for ii in range(rows):
+                for jj in range(cols):
+                    item = matrix[ii,jj]
+                    if item!=0:
+                        lines.append('    '+index.format(out_name,ii,jj,printer.doprint(item)))
+
+        self.imports = sorted(printer.module_imports)
+        header = 'def kernel({0}):'.format(', '.join(group_names+out_names))
+        return '\n'.join([header]+lines+['    return'])+'\n'
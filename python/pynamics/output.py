@@ -5,6 +5,7 @@ Email: danaukes<at>gmail.com
 Please see LICENSE for full license.
 """
 import numpy
+from pynamics.kernel import Kernel
 
 class Output(object):
     def __init__(self,y_exp,system):
@@ -12,7 +13,11 @@ class Output(object):
         self.y_expression = sympy.Matrix(y_exp)
         cons_s = list(system.constants.keys())
         self.cons_v = [system.constants[key] for key in cons_s]
-        self.fy_expression = sympy.lambdify(system.get_q(0)+system.get_q(1)+cons_s,self.y_expression)
+        self.kernel = Kernel([system.get_q(0)+system.get_q(1),cons_s],[self.y_expression],cse=True,module='numpy')
     def calc(self,x):
-        self.y = numpy.array([self.fy_expression(*(item.tolist()+self.cons_v)) for item in x]).squeeze()
+        '''evaluate every row of x, of shape (steps,states) or (runs,steps,states), in one call'''
+        x = numpy.asarray(x)
+        y, = self.kernel.allocate(*x.shape[:-1])
+        self.kernel.function(numpy.moveaxis(x,-1,0),self.cons_v,y)
+        self.y = y.squeeze()
         return self.y
@@ -6,81 +6,78 @@ Please see LICENSE for full license.
 """
 
 import pynamics
+from functools import cached_property
+from pynamics.point import Point
 
 class ParticleGeneric(object):
+    '''a point mass; pCM may be a Point, whose kinematics are then shared'''
     ii = 0
     def __init__(self,system,pCM,mass,name = None):
         if name==None:
             name = 'Particle{0:d}'.format(self.ii)
             type(self).ii+=1
         self.name = name
+        self.point = None
+        if isinstance(pCM,Point):
+            self.point = pCM
+            pCM = pCM.position
         self.pCM = pCM
         self.mass = mass
         self.system = system
 
-        self.vCM=self.pCM.diff_in_parts(self.system.newtonian,self.system)
-        self.aCM=self.vCM.diff_in_parts(self.system.newtonian,self.system)
-                
-        self.effectiveforce = self.mass*self.aCM
-        self.KE = .5*mass*self.vCM.dot(self.vCM)
-#        self.linearmomentum = self.mass*self.vCM
-        
+        self.gravityvector = None
+        self.forcegravity = None
+
+        self.dynamics_added = False
         self.system.particles.append(self)
-        self.adddynamics()
 
-    def adddynamics(self):
-        self.system.addeffectiveforce(self.effectiveforce,self.vCM)
-#        self.system.addmomentum(self.linearmomentum,self.vCM)
-        self.system.addKE(self.KE)
-        
-    def addforcegravity(self,gravityvector):
-        self.gravityvector = gravityvector
-        self.forcegravity = self.mass*gravityvector
-        self.system.addforce(self.forcegravity,self.vCM)
-        
-    def __repr__(self):
-        return self.name+'(particle)'
-#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
-    def __str__(self):
-        return self.name+'(particle)'
-#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
+    @cached_property
+    def vCM(self):
+        if self.point is not None:
+            return self.point.velocity
+        return self.pCM.diff_in_parts(self.system.newtonian,self.system)
 
+    @cached_property
+    def aCM(self):
+        if self.point is not None:
+            return self.point.acceleration
+        return self.vCM.diff_in_parts(self.system.newtonian,self.system)
 
+    @cached_property
+    def linearmomentum(self):
+        return self.mass*self.vCM
 
-class Particle(object):
-    ii = 0
-    def __init__(self,system,pCM,mass,name = None):
-        if name==None:
-            name = 'Particle{0:d}'.format(self.ii)
-            type(self).ii+=1
-        self.name = name
-        self.pCM = pCM
-        self.mass = mass
-        self.system = system
+    @cached_property
+    def effectiveforce(self):
+        return self.mass*self.aCM
 
-        self.vCM=self.pCM.diff_in_parts(self.system.newtonian,self.system)
-        self.aCM=self.vCM.diff_in_parts(self.system.newtonian,self.system)
-                
-        self.effectiveforce = self.mass*self.aCM
-        self.KE = .5*mass*self.vCM.dot(self.vCM)
-#        self.linearmomentum = self.mass*self.vCM
-        
-        self.system.particles.append(self)
-        self.adddynamics()
+    @cached_property
+    def KE(self):
+        return .5*self.mass*self.vCM.dot(self.vCM)
 
     def adddynamics(self):
+        if self.dynamics_added:
+            return
+        self.dynamics_added = True
         self.system.addeffectiveforce(self.effectiveforce,self.vCM)
 #        self.system.addmomentum(self.linearmomentum,self.vCM)
-        self.system.addKE(self.KE)
+        if self.forcegravity is not None:
+            self.system.addforce(self.forcegravity,self.vCM)
         
     def addforcegravity(self,gravityvector):
         self.gravityvector = gravityvector
         self.forcegravity = self.mass*gravityvector
-        self.system.addforce(self.forcegravity,self.vCM)
+        if self.dynamics_added:
+            self.system.addforce(self.forcegravity,self.vCM)
         
     def __repr__(self):
         return self.name+'(particle)'
 #        return self.name+' <frame {0:#x}>'.format(self.__hash__())
     def __str__(self):
         return self.name+'(particle)'
-#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
\ No newline at end of file
+#        return self.name+' <frame {0:#x}>'.format(self.__hash__())
+
+
+
+class Particle(ParticleGeneric):
+    ii = 0
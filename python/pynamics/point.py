@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import pynamics
+from functools import cached_property
+from pynamics.tree_node import TreeNode
+from pynamics.name import Name
+
+class Point(TreeNode):
+    '''
+    A point located by r, a vector from its parent point, or from the
+    origin of the newtonian frame if parent is None.  Its position, velocity
+    and acceleration in the newtonian frame are built on first use from the
+    parent's, differentiating only r, and are shared by every consumer.
+    '''
+    def __init__(self,system,r,parent = None,name = None):
+        super(Point,self).__init__()
+        if name==None:
+            name = Name.point()
+        self.name = name
+        self.system = system
+        self.r = r
+        if parent is not None:
+            parent.add_branch(self)
+        pynamics.addself(self,name)
+
+    def locate(self,r,name = None):
+        '''a new point at r from this one'''
+        return Point(self.system,r,self,name)
+
+    @cached_property
+    def r_d(self):
+        '''rate of change of r in the newtonian frame'''
+        return self.r.time_derivative(self.system.newtonian,self.system)
+
+    @cached_property
+    def r_dd(self):
+        return self.r_d.time_derivative(self.system.newtonian,self.system)
+
+    @cached_property
+    def position(self):
+        if self.parent is None:
+            return self.r
+        return self.parent.position+self.r
+
+    @cached_property
+    def velocity(self):
+        if self.parent is None:
+            return self.r_d
+        return self.parent.velocity+self.r_d
+
+    @cached_property
+    def acceleration(self):
+        if self.parent is None:
+            return self.r_dd
+        return self.parent.acceleration+self.r_dd
+
+    def __repr__(self):
+        return self.name+'(point)'
+    def __str__(self):
+        return self.name+'(point)'
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import numpy
+import scipy.linalg
+from scipy.linalg import lapack
+import sympy
+
+def solve_inv(A,b,m):
+    '''explicit inverse, kept for comparison with older results'''
+    return scipy.linalg.inv(A).dot(b)
+
+def solve_lu(A,b,m):
+    lu,piv,x,info = lapack.dgesv(A,b)
+    if info>0:
+        raise(numpy.linalg.LinAlgError('singular matrix'))
+    return x
+
+def solve_cholesky(A,b,m):
+    '''symmetric positive definite mass matrix, falls back to LU'''
+    c,x,info = lapack.dposv(A,b)
+    if info>0:
+        return solve_lu(A,b,m)
+    return x
+
+def solve_ldl(A,b,m):
+    '''symmetric indefinite (e.g. KKT) matrix, Bunch-Kaufman LDL^T'''
+    udut,ipiv,x,info = lapack.dsysv(A,b)
+    if info>0:
+        raise(numpy.linalg.LinAlgError('singular matrix'))
+    return x
+
+def solve_schur(A,b,m):
+    '''
+    KKT matrix [[M,J.T],[J,0]] with M symmetric positive definite, solved
+    through the Schur complement S = J M^-1 J.T.  Falls back to LU if either
+    M or S is not positive definite.
+    '''
+    n = A.shape[0]-m
+    if n==0:
+        return solve_cholesky(A,b,m)
+    M = A[:m,:m]
+    J = A[m:,:m]
+    c,info = lapack.dpotrf(M)
+    if info>0:
+        return solve_lu(A,b,m)
+    Y,info = lapack.dpotrs(c,numpy.hstack((J.T,b[:m])))
+    MiJT = Y[:,:n]
+    Mib = Y[:,n:]
+    S = J.dot(MiJT)
+    c_S,lam,info = lapack.dposv(S,J.dot(Mib)-b[m:])
+    if info>0:
+        return solve_lu(A,b,m)
+    return numpy.vstack((Mib-MiJT.dot(lam),lam))
+
+solvers = {}
+solvers['inv'] = solve_inv
+solvers['lu'] = solve_lu
+solvers['cholesky'] = solve_cholesky
+solvers['ldl'] = solve_ldl
+solvers['schur'] = solve_schur
+
+def is_symmetric(A):
+    rows,cols = A.shape
+    for ii in range(rows):
+        for jj in range(ii+1,cols):
+            if A[ii,jj]!=A[jj,ii]:
+                if sympy.expand(A[ii,jj]-A[jj,ii])!=0:
+                    return False
+    return True
+
+def select_solver(A_full,m):
+    '''pick a strategy from the symbolic structure of A_full, whose first m rows are the dynamics'''
+    if not is_symmetric(A_full[:m,:m]):
+        return 'lu'
+    if A_full.shape[0]==m:
+        return 'cholesky'
+    if not is_symmetric(A_full):
+        return 'lu'
+    return 'ldl'
+
+def get_solver(solver,A_full,m):
+    if solver=='auto':
+        solver = select_solver(A_full,m)
+    try:
+        return solvers[solver]
+    except KeyError:
+        raise(Exception('unknown solver: '+str(solver)))
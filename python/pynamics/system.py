@@ -8,23 +8,49 @@ Please see LICENSE for full license.
 import sympy
 import pynamics
 import numpy
-import scipy
+import time
+import multiprocessing
 import pydevtools.svd as svd
+from pynamics.kernel import Kernel
+import pynamics.solvers
+from pynamics.instrumentation import compose
+import pynamics.integration
+
+worker_state = None
+
+def init_worker(state):
+    global worker_state
+    worker_state = state
+
+def generalize_row(ii):
+    '''row ii of the generalized forces, evaluated in a pool worker'''
+    system,forces,effectiveforces,terms = worker_state
+    q_d = system.get_q(1)
+    speed = q_d[ii]
+    partials = system.partial_velocities([forces,effectiveforces],[speed])
+    f = system.generalize(forces,[speed],partials)[0]
+    if terms is not None:
+        M,remainder = system.generalize_direct(effectiveforces,q_d,partials,rows = [ii],terms = terms)
+        return f,M[ii,ii:],remainder[ii]
+    return f,system.generalize(effectiveforces,[speed],partials)[0]
+
+def ivp_jacobian(jac):
+    '''jac(state,time,*args) in the argument order of solve_ivp(jac=...), returning a copy of the reused array'''
+    def ivp(time,state,*args):
+        return numpy.array(jac(state,time,*args))
+    return ivp
 
-def static_vars(**kwargs):
-    def decorate(func):
-        for k in kwargs:
-            setattr(func, k, kwargs[k])
-        return func
-    return decorate
-    
 class System(object):
     _z = 0
     def __init__(self):
         self.derivatives = {}
+        self.derivative_memo = {}
         self.constants = {}
         self.forces = []
         self.effectiveforces = []
+        # force vectors summed per distinct velocity, used by getdynamics
+        self.grouped_forces = {}
+        self.grouped_effectiveforces = {}
 #        self.momentum = []
         self.KE = sympy.Number(0)
         self.bodies = []
@@ -32,6 +58,8 @@ class System(object):
         self.q = {}
         self.replacements = {}
         self.springs = []
+        self.cache = None
+        self.direct_dynamics = None
 
     def add_q(self,q,ii):
         if ii in self.q:
@@ -47,6 +75,10 @@ class System(object):
             
     def set_newtonian(self,frame):
         self.newtonian = frame
+
+    def set_cache(self,cache):
+        '''store derived equations in a pynamics.cache.DerivationCache'''
+        self.cache = cache
         
     def generatez(self,number):
         z=sympy.Symbol('z'+str(self._z))
@@ -54,25 +86,52 @@ class System(object):
         self._z+=1
         return z
 
+    @staticmethod
+    def group_force(grouped,force,velocity):
+        if velocity in grouped:
+            grouped[velocity] = grouped[velocity]+force
+        else:
+            grouped[velocity] = force
+
     def addforce(self,force,velocity):
         self.forces.append((force,velocity))
+        self.group_force(self.grouped_forces,force,velocity)
 
     def add_spring_force(self,k,stretch,velocity):
         force = -k*stretch
-        self.forces.append((force,velocity))
+        self.addforce(force,velocity)
         self.springs.append((k,stretch))
 
     def addeffectiveforce(self,effectiveforce,velocity):
         self.effectiveforces.append((effectiveforce,velocity))
+        self.group_force(self.grouped_effectiveforces,effectiveforce,velocity)
 
 #    def addmomentum(self,momentum,velocity):
 #        self.momentum.append((momentum,velocity))
 
     def addKE(self,KE):
-        self.KE+=KE
+        self._KE+=KE
+
+    @property
+    def KE(self):
+        '''KE added with addKE plus that of every body and particle'''
+        KE = self._KE
+        for body in self.bodies+self.particles:
+            KE+=body.KE
+        return KE
+
+    @KE.setter
+    def KE(self,KE):
+        self._KE = KE
+
+    def materialize(self):
+        '''add the effective forces and gravity of bodies and particles, which are computed lazily'''
+        for body in self.bodies+self.particles:
+            body.adddynamics()
 
     def add_derivative(self,expression,variable):
         self.derivatives[expression]=variable
+        self.derivative_memo.clear()
 
     def add_constant(self,constant,value):
         self.constants[constant]=value
@@ -98,36 +157,401 @@ class System(object):
         for particle in self.particles:
             particle.addforcegravity(gravityvector)
 
-    def getdynamics(self):
+    def getdynamics(self,direct = False,method = 'kane',processes = None):
+        '''
+        returns the generalized forces f and generalized effective forces ma.
+
+        direct: build ma as M*q_dd+remainder, with the mass matrix M and the
+        remainder read off the q_dd coefficients of the effective forces
+        (see generalize_direct).  M and the remainder are kept in
+        self.direct_dynamics, and assemble_full uses them instead of a
+        jacobian when it is given this ma.
+        method: 'kane' generalizes the effective forces, 'lagrange' derives
+        M and the remainder from self.KE instead (see lagrange) and is
+        always direct.  benchmark_dynamics compares the two.
+        processes: derive the rows of the kane method in a pool of this many
+        processes.
+        '''
+        if method not in ('kane','lagrange'):
+            raise(Exception('unknown method: '+str(method)))
+        direct = direct or method=='lagrange'
+        if self.cache is not None:
+            items = ['getdynamics']
+            if direct:
+                items.append('direct')
+            if method!='kane':
+                items.append(method)
+            key = self.cache.model_key(self,*items)
+            result = self.cache.load(key)
+            if result is not None:
+                if direct:
+                    self.direct_dynamics = result[1:]
+                    return result[0]
+                return result
+
+        self.materialize()
         q_d = self.get_q(1)
-        generalizedforce=self.generalize(self.forces,q_d)
-        generalizedeffectiveforce=self.generalize(self.effectiveforces,q_d)
+        if method=='lagrange':
+            generalizedforce,M,remainder = self.lagrange()
+        else:
+            forces = [(force,velocity) for velocity,force in self.grouped_forces.items()]
+            effectiveforces = [(force,velocity) for velocity,force in self.grouped_effectiveforces.items()]
+            if processes:
+                results = self.generalize_parallel(forces,effectiveforces,direct,processes)
+            else:
+                partials = self.partial_velocities([forces,effectiveforces],q_d)
+                generalizedforce=self.generalize(forces,q_d,partials)
+                if direct:
+                    results = (generalizedforce,)+self.generalize_direct(effectiveforces,q_d,partials)
+                else:
+                    results = (generalizedforce,self.generalize(effectiveforces,q_d,partials))
+            if direct:
+                generalizedforce,M,remainder = results
+            else:
+                generalizedforce,generalizedeffectiveforce = results
+        if direct:
+            generalizedeffectiveforce = list(M*sympy.Matrix(self.get_q(2))+remainder)
+            self.direct_dynamics = (generalizedeffectiveforce,M,remainder)
+
+        if self.cache is not None:
+            if direct:
+                self.cache.save(key,((generalizedforce,generalizedeffectiveforce),)+self.direct_dynamics)
+            else:
+                self.cache.save(key,(generalizedforce,generalizedeffectiveforce))
         return generalizedforce,generalizedeffectiveforce
 
-    def generalize(self,list1,q_d):
+    def lagrange(self):
+        '''
+        Lagrange's equations, with the speeds taken as the time derivatives of
+        the coordinates.  Returns the generalized forces, the mass matrix and
+        the remaining inertia terms.  Gravity enters through the gradient of
+        its potential energy (see getPEGravity); all other forces, springs
+        included, are generalized as in getdynamics, since a spring's velocity
+        need not be the rate of its stretch.  M is the hessian of self.KE with respect to the
+        speeds (upper triangle, mirrored), and the remainder is the rest of
+        d/dt(dT/dq_d)-dT/dq.
+        '''
+        q = self.get_q(0)
+        q_d = self.get_q(1)
+        m = len(q_d)
+        if len(q)!=m:
+            raise(Exception('lagrange needs one coordinate per speed, got {0:d} coordinates and {1:d} speeds; use method=\'kane\''.format(len(q),m)))
+
+        conservative = [getattr(body,'forcegravity',None) for body in self.bodies+self.particles]
+        grouped = {}
+        for force,velocity in self.forces:
+            if not any(force is item for item in conservative):
+                self.group_force(grouped,force,velocity)
+        forces = [(force,velocity) for velocity,force in grouped.items()]
+        generalizedforce = self.generalize(forces,q_d)
+        PE = -self.getPEGravity(0*self.newtonian.x)
+        generalizedforce = [generalizedforce[ii]-PE.diff(q[ii]) for ii in range(m)]
+
+        T = self.KE
+        speeds = set(q_d)
+        p = [T.diff(item) for item in q_d]
+        M = sympy.zeros(m)
+        remainder = sympy.zeros(m,1)
+        for ii in range(m):
+            for jj in range(ii,m):
+                M[ii,jj] = p[ii].diff(q_d[jj])
+                M[jj,ii] = M[ii,jj]
+            rest = -T.diff(q[ii])
+            for symbol in p[ii].free_symbols:
+                if symbol in self.derivatives and symbol not in speeds:
+                    rest += p[ii].diff(symbol)*self.derivatives[symbol]
+            remainder[ii] = rest
+        return generalizedforce,M,remainder
+
+    @staticmethod
+    def benchmark_dynamics(build,methods = ('kane','lagrange')):
+        '''
+        compare the methods of getdynamics.  build() must return a new,
+        fully set up System; each method gets its own, with the shared
+        product and cost caches cleared, so no method reuses work done for
+        another; sympy's own cache is cleared as well.  The cache of derived
+        equations is bypassed.
+
+        For each method, reports time_materialize (body and particle
+        kinematics, effective forces and KE, which every method needs),
+        time_derive (getdynamics and assemble_full after that), their sum
+        time, and the size (pynamics.vector.cost) of the resulting A and b.
+        '''
+        import pynamics.vector
+        results = {}
+        for method in methods:
+            system = build()
+            system.cache = None
+            pynamics.vector.product_cache.clear()
+            pynamics.vector.expression_cost.cache_clear()
+            sympy.core.cache.clear_cache()
+            t0 = time.perf_counter()
+            system.materialize()
+            t1 = time.perf_counter()
+            f,ma = system.getdynamics(direct = True,method = method)
+            A,b,m = system.assemble_full(f,ma)
+            t2 = time.perf_counter()
+            results[method] = {'time':t2-t0,'time_materialize':t1-t0,'time_derive':t2-t1,'cost_A':pynamics.vector.cost(A),'cost_b':pynamics.vector.cost(b)}
+        return results
+
+    def partial_velocities(self,lists,q_d):
+        '''partial derivative of every distinct velocity in lists of (force,velocity) pairs, keyed by (velocity,speed)'''
+        partials = {}
+        for list1 in lists:
+            for expression,velocity in list1:
+                for speed in q_d:
+                    key = (velocity,speed)
+                    if key not in partials:
+                        partials[key] = velocity.diff_partial_local(speed,self)
+        return partials
+
+    def generalize(self,list1,q_d,partials = None):
+        if partials is None:
+            partials = self.partial_velocities([list1],q_d)
         generalized=[]
         for speed in q_d:
             new = pynamics.ZERO
             for expression,velocity in list1:
-                new+=expression.dot(velocity.diff_partial_local(speed,self))
+                partial = partials[(velocity,speed)]
+                if partial.components:
+                    new+=expression.dot(partial)
             generalized.append(new)
         return generalized
+
+    def direct_terms(self,list1):
+        '''
+        for each force in list1, its coefficient vectors for each q_dd and
+        the force with q_dd set to zero
+        '''
+        q_dd = self.get_q(2)
+        zero = dict((item,sympy.S.Zero) for item in q_dd)
+        coefficients = [[expression.diff_partial_local(accel) for accel in q_dd] for expression,velocity in list1]
+        remainders = [expression.xreplace(zero) for expression,velocity in list1]
+        return coefficients,remainders
+
+    def generalize_direct(self,list1,q_d,partials = None,rows = None,terms = None):
+        '''
+        generalize list1, whose forces are linear in q_dd, into the symmetric
+        mass matrix M and the remaining terms, so that
+        generalize(list1,q_d) = M*q_dd+remainder.  Only the upper triangle of
+        M is computed, and only for rows if given.  terms are the
+        direct_terms of list1, if already computed.
+        '''
+        if partials is None:
+            partials = self.partial_velocities([list1],q_d)
+        if terms is None:
+            terms = self.direct_terms(list1)
+        coefficients,remainders = terms
+        m = len(q_d)
+        M = sympy.zeros(m)
+        remainder = sympy.zeros(m,1)
+        if rows is None:
+            rows = range(m)
+        for ii in rows:
+            speed = q_d[ii]
+            for (expression,velocity),coefficient,rest in zip(list1,coefficients,remainders):
+                partial = partials[(velocity,speed)]
+                if not partial.components:
+                    continue
+                if rest.components:
+                    remainder[ii]+=rest.dot(partial)
+                for jj in range(ii,m):
+                    if coefficient[jj].components:
+                        M[ii,jj]+=coefficient[jj].dot(partial)
+            for jj in range(ii+1,m):
+                M[jj,ii] = M[ii,jj]
+        return M,remainder
+
+    def generalize_parallel(self,forces,effectiveforces,direct,processes):
+        '''
+        generalize one row per task in a process pool.  Workers are forked
+        where possible, so the model is inherited rather than pickled, and
+        each computes only the partial velocities for its own speed.
+        Returns the generalized forces and effective forces, or the
+        generalized forces, M and the remainder if direct.
+        '''
+        m = len(self.get_q(1))
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            context = multiprocessing.get_context()
+        # the q_dd coefficients are shared by every row, so extract them once here
+        terms = self.direct_terms(effectiveforces) if direct else None
+        pool = context.Pool(processes,initializer = init_worker,initargs = ((self,forces,effectiveforces,terms),))
+        try:
+            rows = pool.map(generalize_row,range(m))
+        finally:
+            pool.close()
+            pool.join()
+        generalizedforce = [row[0] for row in rows]
+        if not direct:
+            return generalizedforce,[row[1] for row in rows]
+        M = sympy.zeros(m)
+        remainder = sympy.zeros(m,1)
+        for ii,(f,upper,rest) in enumerate(rows):
+            for jj,item in enumerate(upper):
+                M[ii,ii+jj] = item
+                M[ii+jj,ii] = item
+            remainder[ii] = rest
+        return generalizedforce,M,remainder
         
-    def state_space_pre_invert(system,f,ma,inv_method = 'LU',auto_z= False):
-        '''pre-invert A matrix'''
-        
-        q_state = system.get_q(0)+system.get_q(1)
+    def assemble_full(system,f,ma,eq = None,presolve_constants = False):
+        '''
+        Build A_full*x = b_full from the dynamics and (optional) second
+        derivatives of the constraints, where x is q_dd followed by one
+        multiplier per constraint.  Returns A_full, b_full and the number of
+        generalized speeds m.
+        '''
+        if system.cache is not None:
+            items = [system.get_q(1),system.get_q(2),f,ma,eq,presolve_constants]
+            if presolve_constants:
+                items.append(system.constants)
+            key = system.cache.key('assemble_full',*items)
+            result = system.cache.load(key)
+            if result is not None:
+                return result
 
-#        q_d = system.get_q(1)
+        q_d = system.get_q(1)
         q_dd = system.get_q(2)
+
+        direct = system.direct_dynamics
+        if direct is not None and len(direct[0])==len(ma) and all(a is b for a,b in zip(direct[0],ma)):
+            # mass matrix and remainder from getdynamics(direct=True)
+            f = sympy.Matrix(f)
+            A = direct[1]
+            b = -direct[2]
+            if set(q_dd)&f.free_symbols:
+                A = A-f.jacobian(q_dd)
+                b = b+f.subs(dict(list([(item,0) for item in q_dd])))
+            else:
+                b = b+f
+            if presolve_constants:
+                A = A.subs(system.constants)
+                b = b.subs(system.constants)
+        else:
+            f = sympy.Matrix(f)
+            ma = sympy.Matrix(ma)
         
-        f = sympy.Matrix(f)
-        ma = sympy.Matrix(ma)
+            Ax_b = ma-f
+            if presolve_constants:
+                Ax_b = Ax_b.subs(system.constants)
+            A = Ax_b.jacobian(q_dd)
+            b = -Ax_b.subs(dict(list([(item,0) for item in q_dd])))
+
+        m = len(q_d)
+    
+        eq = eq or []
         
-        Ax_b = ma-f
-        Ax_b = Ax_b.subs(system.constants)
-        A = Ax_b.jacobian(q_dd)
-        b = -Ax_b.subs(dict(list([(item,0) for item in q_dd])))
+        if not eq:
+            A_full = A
+            b_full = b
+        else:
+            eq2 = sympy.Matrix(eq)
+            J = eq2.jacobian(q_dd)
+            c = -eq2.subs(dict(list([(item,0) for item in q_dd])))
+
+            n = len(eq)
+            A_full = sympy.zeros(m+n)   
+            A_full[:m,:m] = A
+            A_full[m:,:m] = J
+            A_full[:m,m:] = J.T
+        
+            b_full = sympy.zeros(m+n,1)
+            b_full[:m,0]=b
+            b_full[m:,0]=c
+
+        if system.cache is not None:
+            system.cache.save(key,(A_full,b_full,m))
+        return A_full,b_full,m
+
+    def state_space_jacobian(system,A_full,b_full,m,c_sym,c_val,solve,eq = None,eq_d = None,eq_active = None,cse = False):
+        '''
+        Compiled jacobian d(state_d)/d(state) of the post-invert state space
+        A_full*x = b_full, using dx = A_full^-1 (db - dA x) so no finite
+        differences are needed.  When eq and eq_d are given, the Baumgarte
+        terms and active rows of state_space_post_invert2 are included and
+        the jacobian takes (state,time,alpha,beta), otherwise (state,time).
+        The returned array is reused between calls.  The boolean sparsity
+        pattern is attached as jac.sparsity, and jac.ivp takes the arguments
+        in the order solve_ivp(jac=jac.ivp) passes them.
+        '''
+        q_state = system.get_q(0)+system.get_q(1)
+        indeces = [q_state.index(element) for element in system.get_q(1)]
+        k = len(indeces)
+        n_s = len(q_state)
+        r = A_full.shape[0]
+
+        dA_blocks = [A_full.diff(item) for item in q_state]
+        dA = sympy.Matrix.vstack(*dA_blocks)
+        db = b_full.jacobian(q_state)
+
+        matrices = [A_full,b_full,dA,db]
+        if eq is not None:
+            columns = [sympy.Matrix(len(item),1,item) for item in [eq,eq_d,eq_active]]
+            matrices += columns+[columns[0].jacobian(q_state),columns[1].jacobian(q_state)]
+        kernel = Kernel([q_state,c_sym],matrices,cse=cse)
+        buffers = kernel.allocate()
+        Ai,bi,dAi,dbi = buffers[:4]
+        dA3 = dAi.reshape(n_s,r,r)
+
+        J = numpy.zeros((n_s,n_s))
+        J[range(k),indeces] = 1
+
+        sparsity = J!=0
+        for jj,block in enumerate(dA_blocks):
+            if any(item!=0 for item in block) or any(item!=0 for item in db[:,jj]):
+                sparsity[k:,jj] = True
+
+        if eq is None:
+            def jac(state,time,*args):
+                state = numpy.asarray(state)
+                kernel.function(state.tolist(),c_val,*buffers)
+                x = solve(Ai,bi,m)
+                R = dbi-numpy.einsum('kij,j->ik',dA3,x[:,0])
+                J[k:,:] = solve(Ai,R,m)[:m,:]
+                return J
+        else:
+            eqi,eq_di,activei,deqi,deq_di = buffers[4:]
+            b_stab = numpy.zeros(bi.shape)
+            db_stab = numpy.zeros(dbi.shape)
+
+            def jac(state,time,*args):
+                alpha, beta = args
+
+                state = numpy.asarray(state)
+                kernel.function(state.tolist(),c_val,*buffers)
+                b_stab[:] = bi
+                b_stab[m:] -= 2*alpha*eq_di+beta**2*eqi
+                db_stab[:] = dbi
+                db_stab[m:] -= 2*alpha*deq_di+beta**2*deqi
+
+                rows = numpy.r_[numpy.arange(m),m+(activei[:,0]!=0).nonzero()[0]]
+                Ar = Ai[numpy.ix_(rows,rows)]
+                x = solve(Ar,b_stab[rows],m)
+                R = db_stab[rows]-numpy.einsum('kij,j->ik',dA3[:,rows[:,None],rows],x[:,0])
+                J[k:,:] = solve(Ar,R,m)[:m,:]
+                return J
+
+        jac.sparsity = sparsity
+        jac.ivp = ivp_jacobian(jac)
+        return jac
+
+    def state_space_pre_invert(system,f,ma,inv_method = 'LU',auto_z= False,fused = False,cse = False,jacobian = False,instrumentation = None):
+        '''pre-invert A matrix
+
+        instrumentation: optional pynamics.instrumentation.Instrumentation
+        which records calls, evaluation time and progress.
+
+        fused: compile the accelerations into one Kernel which writes into a
+        preallocated array.  The returned derivative array is reused.
+        cse: as fused, eliminating common subexpressions first.
+        jacobian: also return a compiled jacobian jac(state,time), with its
+        sparsity pattern in jac.sparsity, for odeint(Dfun=jac) or
+        solve_ivp(jac=jac.ivp).'''
+        
+        q_state = system.get_q(0)+system.get_q(1)
+
+        A,b,m = system.assemble_full(f,ma,presolve_constants=True)
 
         if auto_z:
             def func1(x):
@@ -146,84 +570,132 @@ class System(object):
             A_inv = A.inv(method=inv_method)
         var_dd = A_inv*b 
         
-        functions = [sympy.lambdify(q_state,rhs) for rhs in var_dd]
         indeces = [q_state.index(element) for element in system.get_q(1)]
+
+        if jacobian:
+            k = len(indeces)
+            J_dd = var_dd.jacobian(q_state)
+            kernel_J = Kernel([q_state],[J_dd],cse=cse)
+            J_ddi, = kernel_J.allocate()
+            J = numpy.zeros((len(q_state),len(q_state)))
+            J[range(k),indeces] = 1
+
+            def jac(state,time,*args):
+                kernel_J.function(numpy.asarray(state).tolist(),J_ddi)
+                J[k:,:] = J_ddi
+                return J
+            jac.sparsity = J!=0
+            jac.sparsity[k:,:] = [[item!=0 for item in row] for row in J_dd.tolist()]
+            jac.ivp = ivp_jacobian(jac)
+
+        if fused or cse:
+            kernel = Kernel([q_state],[var_dd],cse=cse)
+            var_ddi, = kernel.allocate()
+            x = numpy.zeros(len(q_state))
+            k = len(indeces)
+
+            def evaluate(state):
+                kernel.function(numpy.asarray(state).tolist(),var_ddi)
+                return (var_ddi,)
+
+            def finish(state,var_ddi):
+                x[:k] = numpy.asarray(state)[indeces]
+                x[k:] = var_ddi[:,0]
+                return x
+
+            func = compose(evaluate,finish,instrumentation)
+
+            if jacobian:
+                return func,jac
+            return func
+
+        functions = [sympy.lambdify(q_state,rhs) for rhs in var_dd]
         
-        @static_vars(ii=0)
-        def func(state,time):
-            if func.ii%100==0:
-                print(time)
-            func.ii+=1
-            
-            x1 = [state[ii] for ii in indeces]
+        def evaluate(state):
             x2 = [f(*state) for f in functions]
+            return (x2,)
+
+        def finish(state,x2):
+            x1 = [state[ii] for ii in indeces]
             x3 = numpy.r_[x1,x2]
             x4 = x3.flatten().tolist()
 
             return x4
 
+        func = compose(evaluate,finish,instrumentation)
+
+        if jacobian:
+            return func,jac
         return func
 
-    def state_space_post_invert(system,f,ma,eq = None,eq_active = None,presolve_constants = False):
-        '''invert A matrix each call'''
-        
-        q_state = system.get_q(0)+system.get_q(1)
+    def state_space_post_invert(system,f,ma,eq = None,eq_active = None,presolve_constants = False,fused = False,cse = False,solver = 'auto',jacobian = False,instrumentation = None):
+        '''invert A matrix each call
 
-        q_d = system.get_q(1)
-        q_dd = system.get_q(2)
+        solver: linear solve strategy from pynamics.solvers ('lu', 'cholesky',
+        'ldl', 'schur', 'inv'), or 'auto' to select one from the structure of
+        A_full.
+
+        fused: compile A and b into one Kernel which writes into preallocated
+        arrays, and solve in place of the explicit inverse.  The returned
+        derivative array is reused and overwritten on the next call.
+        cse: as fused, eliminating common subexpressions across A and b.
+
+        jacobian: also return the compiled jacobian from
+        state_space_jacobian, for odeint(Dfun=jac) or solve_ivp(jac=jac.ivp).
 
-        f = sympy.Matrix(f)
-        ma = sympy.Matrix(ma)
+        instrumentation: optional pynamics.instrumentation.Instrumentation
+        which records calls, time spent evaluating A and b versus solving, and
+        progress.'''
         
-        Ax_b = ma-f
-        if presolve_constants:
-            Ax_b = Ax_b.subs(system.constants)
-        A = Ax_b.jacobian(q_dd)
-        b = -Ax_b.subs(dict(list([(item,0) for item in q_dd])))
+        q_state = system.get_q(0)+system.get_q(1)
 
-        m = len(q_d)
-    
-        eq = eq or []
+        A_full,b_full,m = system.assemble_full(f,ma,eq,presolve_constants)
 #        eq_active = eq_active or []
-        
-        if not eq:
-            A_full = A
-            b_full = b
-            n=0
+            
+        if presolve_constants:
+            c_sym = []
+            c_val = []
         else:
-            eq2 = sympy.Matrix(eq)
-            J = eq2.jacobian(q_dd)
-            c = -eq2.subs(dict(list([(item,0) for item in q_dd])))
+            c_sym = list(system.constants.keys())
+            c_val = [system.constants[key] for key in c_sym]
+
+        indeces = [q_state.index(element) for element in system.get_q(1)]
+        solve = pynamics.solvers.get_solver(solver,A_full,m)
+
+        if jacobian:
+            jac = system.state_space_jacobian(A_full,b_full,m,c_sym,c_val,solve,cse=cse)
+
+        if fused or cse:
+            kernel = Kernel([q_state,c_sym],[A_full,b_full],cse=cse)
+            Ai,bi = kernel.allocate()
+            x = numpy.zeros(len(q_state))
+            k = len(indeces)
+
+            def evaluate(state,*args):
+                kernel.function(numpy.asarray(state).tolist(),c_val,Ai,bi)
+                return Ai,bi
+
+            def finish(state,Ai,bi):
+                x[:k] = numpy.asarray(state)[indeces]
+                x[k:] = solve(Ai,bi,m)[:m,0]
+                return x
+
+            func = compose(evaluate,finish,instrumentation)
+
+            if jacobian:
+                return func,jac
+            return func
 
-            n = len(eq)
-            A_full = sympy.zeros(m+n)   
-            A_full[:m,:m] = A
-            A_full[m:,:m] = J
-            A_full[:m,m:] = J.T
-        
-            b_full = sympy.zeros(m+n,1)
-            b_full[:m,0]=b
-            b_full[m:,0]=c
-            
         if presolve_constants:
             fA = sympy.lambdify(q_state,A_full)
             fb = sympy.lambdify(q_state,b_full)
 #            factive = sympy.lambdify(q_state,sympy.Matrix(eq_active))
         else:
-            c_sym = list(system.constants.keys())
-            c_val = [system.constants[key] for key in c_sym]
             fA = sympy.lambdify(q_state+c_sym,A_full)
             fb = sympy.lambdify(q_state+c_sym,b_full)
 #            factive = sympy.lambdify(q_state+c_sym,sympy.Matrix(eq_active))
 
-        indeces = [q_state.index(element) for element in system.get_q(1)]
-    
-        @static_vars(ii=0)
-        def func(state,time,*args):
-            if func.ii%100==0:
-                print(time)
-            func.ii+=1
-            
+        def evaluate(state,*args):
             if presolve_constants:
                 a = list(state)
             else:
@@ -238,66 +710,93 @@ class System(object):
 #            
 #            Ai2=(f2.dot(Ai)).dot(f2.T)
 #            bi2=f2.dot(bi)
-            
+            return Ai,bi
+
+        def finish(state,Ai,bi):
             x1 = [state[ii] for ii in indeces]
-            x2 = numpy.array(scipy.linalg.inv(Ai).dot(bi)).flatten()
+            x2 = numpy.array(solve(Ai,bi,m)).flatten()
             x3 = numpy.r_[x1,x2[:m]]
             x4 = x3.flatten().tolist()
             
             return x4
             
+        func = compose(evaluate,finish,instrumentation)
+
+        if jacobian:
+            return func,jac
         return func        
 
-    def state_space_post_invert2(system,f,ma,eq_dd,eq_d,eq,eq_active,presolve_constants = False):
-        '''invert A matrix each call'''
-        
-        q_state = system.get_q(0)+system.get_q(1)
+    def state_space_post_invert2(system,f,ma,eq_dd,eq_d,eq,eq_active,presolve_constants = False,fused = False,cse = False,solver = 'auto',jacobian = False,instrumentation = None):
+        '''invert A matrix each call
 
-        q_d = system.get_q(1)
-        q_dd = system.get_q(2)
+        solver: linear solve strategy from pynamics.solvers, or 'auto' to
+        select one from the structure of A_full.
+
+        fused: compile A, b, eq, eq_d and eq_active into one Kernel which
+        writes into preallocated arrays.  The returned derivative array is
+        reused and overwritten on the next call.
+        cse: as fused, eliminating common subexpressions across all of them.
 
-        f = sympy.Matrix(f)
-        ma = sympy.Matrix(ma)
+        jacobian: also return the compiled jacobian from
+        state_space_jacobian, for odeint(Dfun=jac) or solve_ivp(jac=jac.ivp).
+
+        instrumentation: optional pynamics.instrumentation.Instrumentation
+        which records calls, time spent evaluating A and b versus solving, and
+        progress.'''
         
-        Ax_b = ma-f
-        if presolve_constants:
-            Ax_b = Ax_b.subs(system.constants)
-        A = Ax_b.jacobian(q_dd)
-        b = -Ax_b.subs(dict(list([(item,0) for item in q_dd])))
+        q_state = system.get_q(0)+system.get_q(1)
 
-        m = len(q_d)
-    
         eq = eq or []
         eq_d = eq_d or []
         eq_dd = eq_dd or []
         
-        if not eq_dd:
-            A_full = A
-            b_full = b
-            n=0
-        else:
-            eq2 = sympy.Matrix(eq_dd)
-            J = eq2.jacobian(q_dd)
-            c = -eq2.subs(dict(list([(item,0) for item in q_dd])))
-
-            n = len(eq_dd)
-            A_full = sympy.zeros(m+n)   
-            A_full[:m,:m] = A
-            A_full[m:,:m] = J
-            A_full[:m,m:] = J.T
-        
-            b_full = sympy.zeros(m+n,1)
-            b_full[:m,0]=b
-            b_full[m:,0]=c
+        A_full,b_full,m = system.assemble_full(f,ma,eq_dd,presolve_constants)
+        n = len(eq_dd)
 
         eq_active = eq_active or [1]*m
             
         if presolve_constants:
-            state_full = q_state
+            c_sym = []
+            c_val = []
         else:
             c_sym = list(system.constants.keys())
             c_val = [system.constants[key] for key in c_sym]
-            state_full = q_state+c_sym
+        state_full = q_state+c_sym
+
+        indeces = [q_state.index(element) for element in system.get_q(1)]
+        solve = pynamics.solvers.get_solver(solver,A_full,m)
+
+        if jacobian:
+            jac = system.state_space_jacobian(A_full,b_full,m,c_sym,c_val,solve,eq,eq_d,eq_active,cse=cse)
+
+        if fused or cse:
+            columns = [sympy.Matrix(len(item),1,item) for item in [eq,eq_d,eq_active]]
+            kernel = Kernel([q_state,c_sym],[A_full,b_full]+columns,cse=cse)
+            Ai,bi,eqi,eq_di,activei = kernel.allocate()
+            b_stab = numpy.zeros(bi.shape)
+            x = numpy.zeros(len(q_state))
+            k = len(indeces)
+
+            def evaluate(state,*args):
+                alpha, beta = args
+
+                kernel.function(numpy.asarray(state).tolist(),c_val,Ai,bi,eqi,eq_di,activei)
+                b_stab[:] = bi
+                b_stab[m:] -= 2*alpha*eq_di+beta**2*eqi
+
+                rows = numpy.r_[numpy.arange(m),m+(activei[:,0]!=0).nonzero()[0]]
+                return Ai[numpy.ix_(rows,rows)],b_stab[rows]
+
+            def finish(state,Ai,bi):
+                x[:k] = numpy.asarray(state)[indeces]
+                x[k:] = solve(Ai,bi,m)[:m,0]
+                return x
+
+            func = compose(evaluate,finish,instrumentation)
+
+            if jacobian:
+                return func,jac
+            return func
 
         fA = sympy.lambdify(state_full,A_full)
         fb = sympy.lambdify(state_full,b_full)
@@ -305,14 +804,7 @@ class System(object):
         feq_d = sympy.lambdify(state_full,sympy.Matrix(eq_d))
         factive = sympy.lambdify(state_full,sympy.Matrix(eq_active))
 
-        indeces = [q_state.index(element) for element in system.get_q(1)]
-    
-        @static_vars(ii=0)
-        def func(state,time,*args):
-            if func.ii%100==0:
-                print(time)
-            func.ii+=1
-            
+        def evaluate(state,*args):
             alpha, beta = args
             
             if presolve_constants:
@@ -333,14 +825,72 @@ class System(object):
             
             Ai=(f2.dot(Ai)).dot(f2.T)
             bi=f2.dot(bi)
-            
+            return Ai,bi
+
+        def finish(state,Ai,bi):
             x1 = [state[ii] for ii in indeces]
-            x2 = numpy.array(scipy.linalg.inv(Ai).dot(bi)).flatten()
+            x2 = numpy.array(solve(Ai,bi,m)).flatten()
             x3 = numpy.r_[x1,x2[:m]]
             x4 = x3.flatten().tolist()
             return x4
+
+        func = compose(evaluate,finish,instrumentation)
+
+        if jacobian:
+            return func,jac
         return func       
 
+    def state_space_ensemble(system,f,ma,eq = None,cse = True,instrumentation = None):
+        '''
+        Post-invert state space evaluated over an ensemble of states at once.
+
+        The returned function takes an (N,n_state) array of states and an
+        optional dict of constants, whose values may be scalars or arrays of
+        length N to vary them per member.  A and b are evaluated by
+        broadcasting and all N systems are solved in one batched solve.  It
+        returns a new (N,n_state) array of derivatives.
+
+        instrumentation: optional pynamics.instrumentation.Instrumentation.
+        '''
+        q_state = system.get_q(0)+system.get_q(1)
+        A_full,b_full,m = system.assemble_full(f,ma,eq)
+
+        c_sym = list(system.constants.keys())
+        indeces = [q_state.index(element) for element in system.get_q(1)]
+        k = len(indeces)
+
+        kernel = Kernel([q_state,c_sym],[A_full,b_full],cse=cse,module='numpy')
+        buffers = {}
+
+        def evaluate(states,constants=None):
+            states = numpy.asarray(states)
+            N = states.shape[0]
+            constants = constants or {}
+            c_val = [constants.get(key,system.constants[key]) for key in c_sym]
+
+            try:
+                Ai,bi = buffers[N]
+            except KeyError:
+                Ai,bi = buffers[N] = kernel.allocate(N)
+            kernel.function(states.T,c_val,Ai,bi)
+            return Ai,bi
+
+        def finish(states,Ai,bi):
+            states = numpy.asarray(states)
+            x = numpy.empty(states.shape)
+            x[:,:k] = states[:,indeces]
+            x[:,k:] = numpy.linalg.solve(Ai,bi)[:,:m,0]
+            return x
+
+        return compose(evaluate,finish,instrumentation)
+
+    def simulate(self,func,ini,t,**kwargs):
+        '''
+        integrate a state-space function from this system; see
+        pynamics.integration.simulate for the options.  Returns a Simulation.
+        '''
+        return pynamics.integration.simulate(func,ini,t,**kwargs)
+
     @staticmethod
     def assembleconstrained(eq_dyn,eq_con,q_dyn,q_con,method='LU'):
         AC1x_b1 = sympy.Matrix(eq_dyn)
@@ -373,11 +923,24 @@ class System(object):
         return x_dyn,x_con    
 
     def derivative(self,expression):
-        for ii,a in enumerate(self.derivatives.keys()):
-            if ii==0:
-                result = expression.diff(a)*self.derivatives[a]
-            else:
+        '''
+        time derivative by the chain rule over the symbols registered with
+        add_derivative.  Only symbols that appear in the expression are
+        differentiated, matrices are handled entry by entry, and results are
+        memoized per expression until a derivative is added.
+        '''
+        if isinstance(expression,sympy.MatrixBase):
+            return expression.applyfunc(self.derivative)
+        expression = sympy.sympify(expression)
+        try:
+            return self.derivative_memo[expression]
+        except KeyError:
+            pass
+        result = sympy.Number(0)
+        for a in expression.free_symbols:
+            if a in self.derivatives:
                 result += expression.diff(a)*self.derivatives[a]
+        self.derivative_memo[expression] = result
         return result
         
     def state_variables(self):
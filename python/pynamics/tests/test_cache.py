@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+from pynamics.cache import DerivationCache
+from pynamics.tests.test_lagrange import bounciworm
+
+def test_cache_hit_skips_derivation(tmp_path):
+    cache = DerivationCache(str(tmp_path))
+    system = bounciworm()
+    system.set_cache(cache)
+    key = cache.model_key(system,'getdynamics')
+    f,ma = system.getdynamics()
+    assert cache.model_key(system,'getdynamics')==key
+
+    other = bounciworm()
+    other.set_cache(cache)
+    assert other.getdynamics()==(f,ma)
+    assert not any('aCM' in body.__dict__ for body in other.bodies+other.particles)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import numpy
+import pytest
+from pynamics.frame import Frame
+from pynamics.variable_types import Differentiable,Constant
+from pynamics.system import System
+from pynamics.body import Body
+from pynamics.dyadic import Dyadic
+from pynamics.particle import Particle
+
+def bounciworm():
+    '''the model of examples/bounciworm.py, whose springs act on velocities other than the rate of their stretch'''
+    system = System()
+    l1 = Constant('l1',1,system)
+    l2 = Constant('l2',1,system)
+    l3 = Constant('l3',1,system)
+    m1 = Constant('m1',1,system)
+    m2 = Constant('m2',1,system)
+    g = Constant('g',9.81,system)
+    b = Constant('b',1e1,system)
+    k = Constant('k',1e1,system)
+    k_controller = Constant('k_controller',1e2,system)
+    q2_command = Constant('q2_command',numpy.pi/2,system)
+    Ixx_A = Constant('Ixx_A',1e-4,system)
+
+    x,x_d,x_dd = Differentiable(system,'x')
+    y,y_d,y_dd = Differentiable(system,'y')
+    q1,q1_d,q1_dd = Differentiable(system,'q1')
+    q2,q2_d,q2_dd = Differentiable(system,'q2')
+
+    N = Frame('N')
+    A = Frame('A')
+    B = Frame('B')
+    system.set_newtonian(N)
+    A.rotate_fixed_axis_directed(N,[0,0,1],q1,system)
+    B.rotate_fixed_axis_directed(A,[0,0,1],q2,system)
+
+    pm1 = x*N.x+y*N.y
+    vm1 = pm1.time_derivative(N,system)
+    pm2 = pm1 + l3*B.x
+    pk1 = pm1-l1*A.x
+    pk2 = pm1+l2*A.x
+    vk1 = pk1.time_derivative(N,system)
+    vk2 = pk2.time_derivative(N,system)
+
+    Body('BodyA',A,pm1,m1,Dyadic.build(A,Ixx_A,Ixx_A,Ixx_A),system)
+    Particle(system,pm2,m2,'Particle2')
+
+    s3 = (q2-q2_command)*A.z
+    system.add_spring_force(k,pk1.dot(N.y)*N.y,vk1)
+    system.add_spring_force(k,pk2.dot(N.y)*N.y,vk2)
+    system.add_spring_force(k_controller,s3,A.getw_(N))
+    system.add_spring_force(k_controller,-s3,B.getw_(N))
+    system.addforce(-b*vm1,vm1)
+    system.addforcegravity(-g*N.y)
+    return system
+
+def test_lagrange_matches_kane_with_springs():
+    system = bounciworm()
+    f,ma = system.getdynamics()
+    kane = system.state_space_post_invert(f,ma)
+    f,ma = system.getdynamics(method='lagrange')
+    lagrange = system.state_space_post_invert(f,ma)
+
+    random = numpy.random.RandomState(0)
+    for ii in range(10):
+        state = random.uniform(-1,1,8)
+        expected = numpy.array(kane(state,0))
+        numpy.testing.assert_allclose(lagrange(state,0),expected,rtol=1e-8,atol=1e-8*abs(expected).max())
+
+def test_lagrange_needs_a_coordinate_per_speed():
+    system = System()
+    N = Frame('N')
+    A = Frame('A')
+    system.set_newtonian(N)
+    q,q_d,q_dd = Differentiable(system,'q')
+    u_d,u_dd = Differentiable(system,'u',ii=1)
+    A.rotate_fixed_axis_directed(N,[0,0,1],q,system)
+    Particle(system,q*N.x,1)
+    with pytest.raises(Exception,match='one coordinate per speed'):
+        system.getdynamics(method='lagrange')
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import numpy
+import sympy
+from pynamics.variable_types import Differentiable,Constant
+from pynamics.system import System
+from pynamics.output import Output
+from pynamics.kernel import Kernel
+
+def test_output_max_min_piecewise():
+    system = System()
+    k = Constant('k',2,system)
+    q,q_d,q_dd = Differentiable(system,'q')
+    output = Output([sympy.Max(q,0)*k,sympy.Min(q_d,1),sympy.Piecewise((q,q>0),(3*q,True))],system)
+    states = numpy.array([[.5,2.],[-.5,.3]])
+    expected = numpy.array([[1.,1.,.5],[0.,.3,-1.5]])
+    numpy.testing.assert_allclose(output.calc(states),expected)
+
+def test_kernel_max_min_both_modes():
+    x,y = sympy.symbols('x y')
+    matrix = sympy.Matrix([[sympy.Max(x,y),sympy.Min(x,y,0)]])
+    for module in ['math','numpy']:
+        kernel = Kernel([[x,y]],[matrix],module=module)
+        out, = kernel.allocate()
+        kernel([1.,-2.],out)
+        numpy.testing.assert_allclose(out,[[1.,-2.]])
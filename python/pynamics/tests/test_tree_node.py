@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Written by Daniel M. Aukes
+Email: danaukes<at>gmail.com
+Please see LICENSE for full license.
+"""
+
+import math
+import random
+from pynamics.tree_node import TreeNode
+from pynamics.frame import Frame
+from pynamics.system import System
+from pynamics.variable_types import Differentiable
+
+def naive_path(a,b):
+    up = a.path_to_top()
+    down = b.path_to_top()
+    common = [node for node in up if node in down][0]
+    return up[:up.index(common)+1]+down[:down.index(common)][::-1]
+
+def test_path_to_random_trees():
+    generator = random.Random(0)
+    for trial in range(20):
+        nodes = [TreeNode()]
+        for ii in range(60):
+            child = TreeNode()
+            generator.choice(nodes).add_branch(child)
+            nodes.append(child)
+        for ii in range(200):
+            a = generator.choice(nodes)
+            b = generator.choice(nodes)
+            assert a.path_to(b)==naive_path(a,b)
+
+def test_path_to_chains_from_root():
+    for depth in range(1,13):
+        root = TreeNode()
+        chains = []
+        for jj in range(2):
+            node = root
+            for ii in range(depth):
+                child = TreeNode()
+                node.add_branch(child)
+                node = child
+            chains.append(node)
+        a,b = chains
+        assert a.path_to(b)==naive_path(a,b)
+
+def test_dot_between_depth_5_frame_chains():
+    system = System()
+    N = Frame('N')
+    system.set_newtonian(N)
+    leaves = []
+    angles = {}
+    for side in 'LR':
+        parent = N
+        for ii in range(5):
+            q,q_d,q_dd = Differentiable(system,side+'q'+str(ii))
+            angles[q] = .1*(ii+1)*(1 if side=='L' else -1)
+            frame = Frame(side+str(ii))
+            frame.rotate_fixed_axis_directed(parent,[0,0,1],q,system)
+            parent = frame
+        leaves.append(parent)
+    L4,R4 = leaves
+    assert abs(float(L4.x.dot(R4.x).subs(angles))-math.cos(3.))<1e-12
@@ -10,42 +10,85 @@ Please see LICENSE for full license.
 class TreeNode(object):
     def __init__(self):
         self.parent = None
-        self.children = []
-        self.decendents = []
-        self.ancestors = []
+        # insertion-ordered dicts used as ordered sets
+        self.children = {}
+        self.decendents = {}
+        self.ancestors = {}
+        self.depth = 0
+        self.jumps = []
 
     def _set_parent(self,parent):
         self.parent = parent
+        self._set_jumps()
+
+    def _set_jumps(self):
+        '''
+        depth in the tree, and jumps[k], the ancestor 2**k levels up, so the
+        lowest common ancestor can be found in O(log(depth)) steps
+        '''
+        if self.parent==None:
+            self.depth = 0
+            self.jumps = []
+        else:
+            self.depth = self.parent.depth+1
+            jumps = [self.parent]
+            while len(jumps[-1].jumps)>=len(jumps):
+                jumps.append(jumps[-1].jumps[len(jumps)-1])
+            self.jumps = jumps
 
     def _add_children(self,children):
-        self.children.extend(children)
-        self.children = list(set(self.children))
+        self.children.update(dict.fromkeys(children))
 
     def _add_decendents(self,decendents,recursive = True):
-        self.decendents.extend(decendents)
-        self.decendents = list(set(self.decendents))
-        if recursive:
-            if self.parent!=None:
-                self.parent._add_decendents(decendents,recursive)
+        new = dict.fromkeys(decendents)
+        node = self
+        while node!=None:
+            node.decendents.update(new)
+            node = node.parent if recursive else None
 
     def _add_ancestors(self,ancestors):
-        self.ancestors.extend(ancestors)
-        self.ancestors = list(set(self.ancestors))
+        self.ancestors.update(dict.fromkeys(ancestors))
 
     def top(self):
-        if self.parent==None:
-            return self
-        else:
-            return self.parent.top()
+        node = self
+        while node.parent!=None:
+            node = node.parent
+        return node
             
     def path_to_top(self,path_in=None):
         if path_in == None:
             path_in = []
-        path_in = path_in+[self]
-        if self.parent==None:
-            return path_in
-        else:
-            return self.parent.path_to_top(path_in)
+        path = list(path_in)
+        node = self
+        while node!=None:
+            path.append(node)
+            node = node.parent
+        return path
+
+    def ancestor_at_depth(self,depth):
+        node = self
+        difference = node.depth-depth
+        k = 0
+        while difference:
+            if difference&1:
+                node = node.jumps[k]
+            difference>>=1
+            k+=1
+        return node
+
+    def lowest_common_ancestor(self,other):
+        '''returns None if the nodes are in different trees'''
+        depth = min(self.depth,other.depth)
+        a = self.ancestor_at_depth(depth)
+        b = other.ancestor_at_depth(depth)
+        if a is b:
+            return a
+        for k in range(len(a.jumps)-1,-1,-1):
+            # a and b share a depth, and fewer jumps exist as they move up
+            if k<len(a.jumps) and a.jumps[k] is not b.jumps[k]:
+                a = a.jumps[k]
+                b = b.jumps[k]
+        return a.parent if a.parent is b.parent else None
 
     def build_topology(self,ancestors=None,parent = None):
         if ancestors == None:
@@ -55,26 +98,30 @@ class TreeNode(object):
 
         for child in self.children:
             child.build_topology(ancestors+[self],self)
-        self._add_decendents(self.children)
 
     def path_to(self,other):
-        a = self.path_to_top()[::-1]
-        b = other.path_to_top()[::-1]
-        if a[0]!=b[0]:
+        common = self.lowest_common_ancestor(other)
+        if common==None:
             raise(Exception("Frames don't share a common parent"))
-        for ii,(item1,item2) in enumerate(zip(a,b)):
-            if item1!=item2:
-                ii-=1
-                break
-        return a[:ii:-1]+b[ii:]
+        a = []
+        node = self
+        while node is not common:
+            a.append(node)
+            node = node.parent
+        b = []
+        node = other
+        while node is not common:
+            b.append(node)
+            node = node.parent
+        return a+[common]+b[::-1]
 
     def is_connected(self,other):
         return self.top()==other.top()
     
     def add_branch(self,child):
         self._add_children([child])
-        child.build_topology(self.ancestors+[self],self)
-        self._add_decendents([child]+child.decendents)
+        child.build_topology(list(self.ancestors)+[self],self)
+        self._add_decendents([child]+list(child.decendents))
     
     def leaves(self):
         top = self.top()
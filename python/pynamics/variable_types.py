@@ -8,11 +8,19 @@ Please see LICENSE for full license.
 import sympy
 import pynamics
 
+def rebuild(cls,name,attributes):
+    '''recreate a pynamics symbol when unpickling, without registering it again'''
+    obj = sympy.Symbol.__new__(cls,name)
+    obj.__dict__.update(attributes)
+    return obj
+
 class Variable(sympy.Symbol):
     def __new__(self,name):
         obj = sympy.Symbol.__new__(self,name)
         pynamics.addself(obj,name)
         return obj
+    def __reduce__(self):
+        return (rebuild,(type(self),self.name,self.__dict__.copy()))
 
 class Constant(sympy.Symbol):
     def __new__(self,name,value,system):
@@ -21,6 +29,8 @@ class Constant(sympy.Symbol):
         system.add_constant(obj,value)
         pynamics.addself(obj,name)
         return obj
+    def __reduce__(self):
+        return (rebuild,(type(self),self.name,self.__dict__.copy()))
 
 class Differentiable(sympy.Symbol):
     ii = 0    
@@ -47,3 +57,5 @@ class Differentiable(sympy.Symbol):
         for a,a_d in zip(differentiables[:-1],differentiables[1:]):
             sys.add_derivative(a,a_d)
         return differentiables 
+    def __reduce__(self):
+        return (rebuild,(type(self),self.name,self.__dict__.copy()))
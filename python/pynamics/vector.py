@@ -7,21 +7,89 @@ Please see LICENSE for full license.
 """
 
 import sympy
+import functools
+from pynamics.cache import LRUCache
+
+# dot and cross products of vectors, keyed by value; cleared whenever a
+# rotation or branch is added to the frame tree
+product_cache = LRUCache(4096)
+
+@functools.lru_cache(maxsize=2**16)
+def expression_cost(expression):
+    '''number of nodes in the expression tree, memoized per subexpression'''
+    return 1+sum(expression_cost(arg) for arg in expression.args)
+
+def cost(item):
+    '''expression_cost of a scalar, or summed over a matrix or vector'''
+    if isinstance(item,Vector):
+        return sum(cost(vec) for vec in item.components.values())
+    if isinstance(item,sympy.MatrixBase):
+        return sum(expression_cost(entry) for entry in item)
+    return expression_cost(sympy.sympify(item))
+
+def immutable(vector):
+    if isinstance(vector,sympy.ImmutableMatrix):
+        return vector
+    return sympy.ImmutableMatrix(vector)
+
+def is_zero_entry(item):
+    '''syntactic check only, no assumptions are queried'''
+    return item is sympy.S.Zero or (item.is_Number and item.is_zero)
+
+def is_zero(vector):
+    for item in vector:
+        if not is_zero_entry(item):
+            return False
+    return True
 
 class Vector(object):
+    '''
+    Immutable sum of per-frame components.  components maps each frame to an
+    ImmutableMatrix and is never modified once built, so operations share the
+    entries they do not change and vectors can be hashed and cached.
+    '''
+    __slots__ = ['components','_hash']
+
     def __init__(self,components=None):
-        self.components = {}
+        new = {}
         if components!=None:
             for frame,vec in components.items():
-                self.add_component(frame,vec)
-        self.clean()
-            
-    def add_component(self,frame,vector):
-        try:
-            self.components[frame]+=vector
-        except KeyError:
-            self.components[frame]=sympy.Matrix(vector)
-#        self.clean()
+                vec = immutable(vec)
+                if frame in new:
+                    vec = new[frame]+vec
+                new[frame] = vec
+        object.__setattr__(self,'components',clean_components(new))
+        object.__setattr__(self,'_hash',None)
+
+    @classmethod
+    def from_components(cls,components):
+        '''wraps an already clean dict of ImmutableMatrix without copying it'''
+        new = object.__new__(cls)
+        object.__setattr__(new,'components',components)
+        object.__setattr__(new,'_hash',None)
+        return new
+
+    def __setattr__(self,name,value):
+        raise(AttributeError('Vector is immutable'))
+
+    def __reduce__(self):
+        return (Vector.from_components,(self.components,))
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self,'_hash',hash(frozenset(self.components.items())))
+        return self._hash
+
+    def __eq__(self,other):
+        if isinstance(other,Vector):
+            return self.components==other.components
+        return NotImplemented
+
+    def __ne__(self,other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
 
     def __str__(self):
         return str(self.symbolic())
@@ -30,52 +98,56 @@ class Vector(object):
         return str(self)
 
     def __mul__(self,other):
-        newvec = Vector(self.components.copy())
-        for key,value in newvec.components.items():
-            newvec.components[key] *= other
-        newvec.clean()
-        return newvec
+        return Vector.from_components(clean_components(dict((frame,vec*other) for frame,vec in self.components.items())))
 
     def __rmul__(self,other):
         return self.__mul__(other)
 
+    def combine(self,other,sign=1):
+        if not other.components:
+            return self
+        if not self.components:
+            return other if sign==1 else -other
+        new = self.components.copy()
+        for frame,vec in other.components.items():
+            if sign!=1:
+                vec = -vec
+            if frame in new:
+                vec = new[frame]+vec
+                if is_zero(vec):
+                    del new[frame]
+                    continue
+            new[frame] = vec
+        return Vector.from_components(new)
+
     def __add__(self,other):
-        newvec = Vector()
-        newvec.components = self.components.copy()
+        if isinstance(other,Vector):
+            return self.combine(other)
         if other==0:
-            return newvec
-            newvec.clean()
-        else:
-            for frame,vector in other.components.items():
-                newvec.add_component(frame,vector)
-            newvec.clean()
-            return newvec
+            return self
+        return NotImplemented
 
     def __radd__(self,other):
         return self.__add__(other)
 
     def __sub__(self,other):
-        newvec = Vector()
-        newvec.components = self.components.copy()
-        for frame,vector in other.components.items():
-            newvec.add_component(frame,-vector)
-        newvec.clean()
-        return newvec
+        return self.combine(other,-1)
 
     def __neg__(self):
-        newvec = Vector()
-        newvec.components = self.components.copy()
-        for frame,vector in newvec.components.items():
-            newvec.components[frame]=-vector
-        newvec.clean()
-        return newvec
+        return Vector.from_components(dict((frame,-vec) for frame,vec in self.components.items()))
     
     def dot(self,other,frame='source'):
         from pynamics.dyadic import Dyad,Dyadic
         result = sympy.Number(0)
         if isinstance(other,Dyad) or isinstance(other,Dyadic):
             return other.rdot(self)
-        return self.product_simplest(other,result,'dot',self.frame_dot,frame='mid')
+        key = ('dot',self,other)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
+        result = self.product_simplest(other,result,'dot',self.frame_dot,frame='mid')
+        product_cache.put(key,result)
+        return result
 #        return self.product_simple(other,result,'dot',self.frame_dot)
 #        return self.product_by_basis_vectors(other,result,'dot',self.frame_dot)
 
@@ -84,10 +156,14 @@ class Vector(object):
         result = Vector()
         if isinstance(other,Dyad) or isinstance(other,Dyadic):
             return other.rcross(self)
+        key = ('cross',self,other)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
         result = self.product_simplest(other,result,'cross',self.frame_cross,frame='mid')
+        product_cache.put(key,result)
 #        result = self.product_simple(other,result,'cross',self.frame_cross)
 #        result = self.product_by_basis_vectors(other,result,'cross',self.frame_cross)
-        result.clean()
         return result
         
     @staticmethod
@@ -119,9 +195,7 @@ class Vector(object):
 #        return result
 
     def copy(self):
-        newvec = Vector(self.components.copy())
-        newvec.clean()
-        return newvec
+        return self
     
     def product_by_basis_vectors(self,other,result_seed,function,inner_function):
         self = self.copy()
@@ -146,10 +220,11 @@ class Vector(object):
                     v2 = b[frame2][1]
                     result+=inner_function(v1,v2,frame1)
 #        result.clean()
-        if len(str(result))<len(str(result.expand())):
+        expanded = result.expand()
+        if cost(result)<cost(expanded):
             return result
         else:
-            return result.expand()
+            return expanded
 #        result = result.expand()
 #        return result
 #        result2 = self.product_simple(other,result_seed,function,inner_function).expand()
@@ -199,7 +274,7 @@ class Vector(object):
             v1 = self.express(frame)
             v2 = other.express(frame)
             results.append(result_seed+inner_function(v1,v2,frame))
-        lens = [len(str(item)) for item in results]
+        lens = [cost(item) for item in results]
         shortest = sorted(lens)[0]
         result = results[lens.index(shortest)]
 #        result.clean()
@@ -215,28 +290,20 @@ class Vector(object):
             v1 = Vector({frame:vector})
             w_ = other.getw_(frame)
             result+=w_.cross(v1,frame = 'mid')
-        result.clean()
         return result
             
     def express(self,other):
-        self = self.copy()
-#        results = []
-        try:
-#            results.append(self.components.pop(other))
-            result = Vector({other:self.components.pop(other)})
-        except KeyError:
-            result = Vector()
-#            pass
+        if not self.components or (len(self.components)==1 and other in self.components):
+            return self
+        result = None
         for frame,vec in self.components.items():
-            R = frame.getR(other)
-            result+=Vector({other:R*vec})
-#            results.append()
-#        result = results.pop()
-#        while not not results:
-#            result+=results.pop()
-#        new = Vector({other:result})
-        result.clean()
-        return result
+            if frame is not other:
+                vec = frame.getR(other)*vec
+            if result is None:
+                result = vec
+            else:
+                result = result+vec
+        return Vector({other:result})
 
     def symbolic(self):
         result = sympy.Number(0)
@@ -252,18 +319,12 @@ class Vector(object):
 #        return newvec
         
     def diff_partial_local(self,var,sys = None):
-        newvec = Vector()
-        for frame,vec in self.components.items():
-            result = vec.diff(var)
-            newvec.components[frame] = result
-        newvec.clean()
-        return newvec
+        return Vector.from_components(clean_components(dict((frame,vec.diff(var)) for frame,vec in self.components.items())))
         
     def diff_simple(self,frame,sys=None):
         v = self.express(frame).components[frame]
         dv = sys.derivative(v)
         newvec = Vector({frame:dv})
-        newvec.clean()
         return newvec
 
     def split_by_frame(self):
@@ -276,25 +337,25 @@ class Vector(object):
         bvs = []
         for frame, vec in self.components.items():
             for val,sym in zip(vec,frame.syms):
-                if val!=0:
+                if not is_zero_entry(val):
                     bvs.append(sym)
         return bvs
 
     def split_by_nonzero_basis_vectors(self):
         bvs = {}
         for frame, vec in self.components.items():
-            if vec!=sympy.Matrix([0,0,0]):
+            if not is_zero(vec):
                 bvs[frame] = [],Vector({frame:vec})
             for val,sym,bv in zip(vec,frame.syms,[frame.x,frame.y,frame.z]):
-                if val!=0:
+                if not is_zero_entry(val):
                     bvs[frame][0].append((sym,val*bv))
         return bvs
         
     def expand(self):
-        new = self.copy()
-        for key in new.components:
-            new.components[key] = new.components[key].expand()
-        return new
+        return Vector.from_components(clean_components(dict((frame,vec.expand()) for frame,vec in self.components.items())))
+
+    def xreplace(self,rule):
+        return Vector.from_components(clean_components(dict((frame,vec.xreplace(rule)) for frame,vec in self.components.items())))
 
     def atoms(self,*args,**kwargs):
         atoms = []
@@ -302,14 +363,29 @@ class Vector(object):
             atoms.extend(value.atoms(*args,**kwargs))
         return set(atoms)
 
-    def clean(self):
-        zero_keys = [frame for frame,vector in self.components.items() if vector.is_zero]
-        for key in zero_keys:
-            self.components.pop(key)
-        return self
+    def clean(self,simplify = False):
+        '''
+        Structurally zero components are dropped whenever a vector is built.
+        With simplify, components that only simplify to zero are dropped too.
+        '''
+        if not simplify:
+            return self
+        if simplify==True:
+            simplify = sympy.simplify
+        components = dict((frame,vec) for frame,vec in self.components.items() if not all(is_zero_entry(simplify(item)) for item in vec))
+        if len(components)==len(self.components):
+            return self
+        return Vector.from_components(components)
             
     def frames(self):
-        nonzero_frames = [frame for frame,vector in self.components.items() if vector.is_zero==False]
+        nonzero_frames = [frame for frame,vector in self.components.items() if not is_zero(vector)]
         return nonzero_frames
+
+def clean_components(components):
+    '''drops zero components in place and returns the dict'''
+    zero_keys = [frame for frame,vector in components.items() if is_zero(vector)]
+    for key in zero_keys:
+        del components[key]
+    return components
                 
         
\ No newline at end of file